@@ -0,0 +1,91 @@
+"""
+知识库文档列表的会话级缓存
+
+同一次维护流程中（例如先查重再去重），多个操作都会先全量拉取一次文档列表。
+缓存按知识库保存列表，超过有效期或超出条目上限（最久未使用的先淘汰）时失效；
+客户端自身的写操作（上传、删除、触发解析）会直接写入缓存，保持缓存与服务端一致。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+
+class ListingCache:
+    """
+    按知识库缓存文档列表，带TTL与LRU淘汰
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 16):
+        """
+        Args:
+            ttl: 缓存有效期（秒），小于等于0表示禁用缓存
+            max_entries: 最多缓存的知识库数量
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # kb_id -> (缓存时间, OrderedDict[doc_id, doc])
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        """丢弃已过期的条目，调用方需持有锁；写入方法也要先清理，否则只写不读时过期的列表会无限增长"""
+        now = time.monotonic()
+        for kb_id in [kb_id for kb_id, (cached_at, _) in self._entries.items() if now - cached_at > self.ttl]:
+            del self._entries[kb_id]
+
+    def get(self, kb_id: str) -> Optional[List[dict]]:
+        """获取未过期的文档列表，未命中时返回None"""
+        with self._lock:
+            self._prune()
+            entry = self._entries.get(kb_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(kb_id)
+            return list(entry[1].values())
+
+    def put(self, kb_id: str, docs: Iterable[dict]):
+        """写入完整的文档列表"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[kb_id] = (time.monotonic(), OrderedDict((doc.get('id'), doc) for doc in docs))
+            self._entries.move_to_end(kb_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def upsert(self, kb_id: str, docs: Iterable[dict]):
+        """新增或替换已缓存列表中的文档，列表未缓存或已过期时不做任何事"""
+        with self._lock:
+            self._prune()
+            entry = self._entries.get(kb_id)
+            if entry is not None:
+                for doc in docs:
+                    entry[1][doc.get('id')] = doc
+
+    def remove(self, doc_ids: Iterable[str]):
+        """从所有已缓存的列表中移除文档"""
+        doc_ids = set(doc_ids)
+        with self._lock:
+            self._prune()
+            for _, docs in self._entries.values():
+                for doc_id in doc_ids:
+                    docs.pop(doc_id, None)
+
+    def update(self, doc_ids: Iterable[str], **fields):
+        """更新所有已缓存列表中文档的字段"""
+        doc_ids = set(doc_ids)
+        with self._lock:
+            self._prune()
+            for _, docs in self._entries.values():
+                for doc_id in doc_ids:
+                    doc = docs.get(doc_id)
+                    if doc is not None:
+                        docs[doc_id] = {**doc, **fields}
+
+    def invalidate(self, kb_id: str = None):
+        """使某个知识库（或全部）的缓存失效"""
+        with self._lock:
+            if kb_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(kb_id, None)
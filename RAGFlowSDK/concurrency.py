@@ -0,0 +1,204 @@
+"""
+基于AIMD（加性增、乘性减）的自适应并发控制
+
+每类接口（list、upload、download、rm、run、retrieval）各自维护一个并发上限：
+请求成功且延迟平稳时缓慢增加上限，遇到 429/5xx/超时 或延迟突增时按比例削减上限。
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+ENDPOINT_CLASSES = ("list", "upload", "download", "rm", "run", "retrieval", "other")
+
+# 服务器过载的状态码
+OVERLOAD_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 各类别的默认参数：上传和下载的耗时主要取决于文件大小，大文件的耗时不代表服务端过载，不做延迟突增检测
+DEFAULT_LIMITS = {
+    "upload": {"latency_spike": None},
+    "download": {"latency_spike": None},
+}
+
+
+class AIMDLimiter:
+    """
+    单个接口类别的AIMD并发限制器
+    """
+
+    def __init__(self, name: str, initial: int = 2, min_limit: int = 1, max_limit: int = 32,
+                 increase: float = 1.0, decrease: float = 0.5, latency_spike: float = 2.0,
+                 smoothing: float = 0.2, cooldown: float = 1.0):
+        """
+        Args:
+            name: 接口类别名称
+            initial: 初始并发上限
+            min_limit: 并发上限的下限
+            max_limit: 并发上限的上限
+            increase: 每经过一个“窗口”（约等于当前上限个成功请求）增加的并发数
+            decrease: 发生拥塞时上限乘以的系数
+            latency_spike: 单次延迟超过平滑延迟的倍数时视为延迟突增，为None时不检测延迟突增
+            smoothing: 平滑延迟（EWMA）的权重
+            cooldown: 两次削减之间的最小间隔（秒），避免同一批失败请求把上限连续削到底
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_spike = latency_spike
+        self.smoothing = smoothing
+        self.cooldown = cooldown
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._in_flight = 0
+        self._ewma_latency = None
+        self._last_decrease = 0.0
+        self._successes = 0
+        self._errors = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def set_bounds(self, min_limit: int, max_limit: int):
+        """调整并发上限的范围，当前上限会被截断到新范围内"""
+        with self._cond:
+            self.min_limit = min_limit
+            self.max_limit = max_limit
+            self._limit = float(max(min_limit, min(self._limit, max_limit)))
+            self._cond.notify_all()
+
+    def acquire(self):
+        """等待直到在途请求数低于当前上限"""
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, latency: float, error: bool):
+        """
+        归还并发名额并根据请求结果调整上限
+
+        Args:
+            latency: 请求耗时（秒）
+            error: 是否为拥塞类错误（429/5xx/超时）
+        """
+        with self._cond:
+            self._in_flight -= 1
+            spike = (self.latency_spike is not None and self._ewma_latency is not None
+                     and latency > self._ewma_latency * self.latency_spike)
+            if error or spike:
+                if error:
+                    self._errors += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self._limit = max(float(self.min_limit), self._limit * self.decrease)
+                    self._last_decrease = now
+            else:
+                self._successes += 1
+                self._limit = min(float(self.max_limit), self._limit + self.increase / self._limit)
+            if not error:
+                # 失败请求的耗时（例如超时）不计入平滑延迟
+                if self._ewma_latency is None:
+                    self._ewma_latency = latency
+                else:
+                    self._ewma_latency += self.smoothing * (latency - self._ewma_latency)
+            self._cond.notify_all()
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "latency_ewma": self._ewma_latency,
+                "successes": self._successes,
+                "errors": self._errors,
+            }
+
+
+class ConcurrencyController:
+    """
+    按接口类别管理AIMD限制器
+    """
+
+    def __init__(self, limits: dict = None, **defaults):
+        """
+        Args:
+            limits: 按类别覆盖限制器参数，例如 {"upload": {"initial": 1, "max_limit": 8}}
+            **defaults: 所有类别共用的限制器参数（各类别的默认参数见 DEFAULT_LIMITS）
+        """
+        limits = limits or {}
+        self.limiters = {}
+        for name in ENDPOINT_CLASSES:
+            options = dict(defaults)
+            options.update(DEFAULT_LIMITS.get(name, {}))
+            options.update(limits.get(name, {}))
+            self.limiters[name] = AIMDLimiter(name, **options)
+
+    @staticmethod
+    def classify(url: str) -> str:
+        """根据请求URL判断接口类别"""
+        path = url.split("?", 1)[0].rstrip("/")
+        if path.endswith("/document/list"):
+            return "list"
+        if path.endswith("/document/upload"):
+            return "upload"
+        if "/document/get/" in path:
+            return "download"
+        if path.endswith("/document/rm"):
+            return "rm"
+        if path.endswith("/document/run"):
+            return "run"
+        if path.endswith("/chunk/retrieval_test"):
+            return "retrieval"
+        return "other"
+
+    @contextmanager
+    def slot(self, endpoint: str):
+        """
+        占用一个并发名额，yield出的字典中由调用方写入 status_code 或 error 以便调整上限。
+        业务异常不视为拥塞，超时等网络错误需由调用方显式标记 error。
+        """
+        limiter = self.limiters[endpoint]
+        outcome = {"status_code": None, "error": False}
+        limiter.acquire()
+        start = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            error = outcome["error"] or outcome["status_code"] in OVERLOAD_STATUS_CODES
+            limiter.release(time.monotonic() - start, error)
+
+    def map(self, endpoint: str, func, items):
+        """
+        用线程池并发执行 func(item)，在途任务数始终不超过该类别当前的并发上限
+
+        每完成一个任务重新读取一次上限再补充新任务，上限随AIMD调整而变化；
+        线程池按需创建线程，实际线程数不会超过运行期间达到过的上限。
+        :return: 生成器，按完成顺序产出 (item, func(item))
+        """
+        limiter = self.limiters[endpoint]
+        items = iter(items)
+        running = {}
+        exhausted = False
+        with ThreadPoolExecutor(max_workers=limiter.max_limit, thread_name_prefix=f"{endpoint}-worker") as pool:
+            while True:
+                while not exhausted and len(running) < max(1, limiter.limit):
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    running[pool.submit(func, item)] = item
+                if not running:
+                    return
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield running.pop(future), future.result()
+
+    def status(self) -> dict:
+        """返回各类别当前的并发上限及统计信息"""
+        return {name: limiter.status() for name, limiter in self.limiters.items()}
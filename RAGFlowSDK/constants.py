@@ -2,4 +2,5 @@ import os
 
 USER_HOME = os.path.expanduser("~")
 CONFIG_DIR = os.path.join(USER_HOME, ".config")
-APP_CONFIG_DIR = os.path.join(CONFIG_DIR, "RAGFlowCli")
\ No newline at end of file
+APP_CONFIG_DIR = os.path.join(CONFIG_DIR, "RAGFlowCli")
+MANIFEST_DIR = os.path.join(APP_CONFIG_DIR, "manifests")
\ No newline at end of file
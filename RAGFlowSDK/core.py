@@ -1,19 +1,33 @@
+import csv
 import json
 import logging
 import os
 import hashlib
+import itertools
+import multiprocessing
 import sqlite3
 import sys
+import threading
+import time
 
 import requests
 from typing import Optional
 
 from RAGFlowSDK import logger
-from RAGFlowSDK.constants import APP_CONFIG_DIR
+from RAGFlowSDK.cache import ListingCache
+from RAGFlowSDK.concurrency import OVERLOAD_STATUS_CODES, ConcurrencyController
+from RAGFlowSDK.constants import APP_CONFIG_DIR, MANIFEST_DIR
+from RAGFlowSDK.loadtest import RetrievalLoadRunner, load_queries, save_run
+from RAGFlowSDK.manifest import ManifestReader, write_manifest
+from RAGFlowSDK.preflight import DEFAULT_MAX_UPLOAD_SIZE, check_file, preflight, schedule_by_size
+from RAGFlowSDK.watcher import WatchFolderDaemon
+from RAGFlowSDK.workqueue import Heartbeat, UploadQueue, new_owner_id
 
 
 class RAGFlowCli:
-    def __init__(self, auth_token: str = None, base_url: str = None, db_path: str = "documents.db"):
+    def __init__(self, auth_token: str = None, base_url: str = None, db_path: str = "documents.db",
+                 concurrency: ConcurrencyController = None, max_upload_size: int = None,
+                 listing_cache: ListingCache = None):
         # 初始化logger
         logger.init("RAGFlowCli")
         if auth_token is None:
@@ -27,6 +41,12 @@ class RAGFlowCli:
         self.upload_url = f"{self.base_url}/v1/document/upload"
         self.search_url = f"{self.base_url}/v1/document/list"
         self.download_url = f"{self.base_url}/v1/document/get"
+        self.retrieval_url = f"{self.base_url}/v1/chunk/retrieval_test"
+        # 服务端允许上传的最大文件大小，需与RAGFlow的 MAX_CONTENT_LENGTH 保持一致
+        if max_upload_size is None:
+            self.max_upload_size = int(os.environ.get("RAGFLOW_MAX_UPLOAD_SIZE", DEFAULT_MAX_UPLOAD_SIZE))
+        else:
+            self.max_upload_size = max_upload_size
         self.headers = {
             'Accept': 'application/json',
             'Accept-Language': 'zh-CN',
@@ -37,8 +57,13 @@ class RAGFlowCli:
         }
         if not os.path.exists(APP_CONFIG_DIR):
             os.makedirs(APP_CONFIG_DIR)
-        self.db_path = os.path.join(APP_CONFIG_DIR, "documents.db")
+        # 相对路径存放在配置目录下；多机协同上传时可传入网络卷上的绝对路径共享同一个数据库
+        self.db_path = db_path if os.path.isabs(db_path) else os.path.join(APP_CONFIG_DIR, db_path)
         self._init_db()
+        # 按接口类别自适应调整并发上限，多线程共享同一个客户端时生效
+        self.concurrency = concurrency or ConcurrencyController()
+        # 文档列表缓存，连续的维护操作不必重复全量拉取同一个知识库
+        self.listing_cache = listing_cache or ListingCache()
 
     def _init_db(self):
         """初始化SQLite数据库"""
@@ -76,16 +101,23 @@ class RAGFlowCli:
                          ''')
             print("数据库表结构已更新")
 
+        # 全局内容哈希索引：跨知识库查重和按哈希查找都按 (file_hash, kb_id) 顺序扫描索引
+        c.execute('CREATE INDEX IF NOT EXISTS idx_documents_file_hash ON documents (file_hash, kb_id)')
+        # 单个知识库内查重按 (kb_id, file_hash) 顺序扫描
+        c.execute('CREATE INDEX IF NOT EXISTS idx_documents_kb_file_hash ON documents (kb_id, file_hash)')
+
         conn.commit()
         conn.close()
 
-    def __do_request__(self, method: str, url: str, **kwargs) -> dict:
+    def __do_request__(self, method: str, url: str, outcome: dict = None, **kwargs) -> dict:
         """
         统一处理HTTP请求
 
         Args:
             method: HTTP方法 ('GET', 'POST' 等)
             url: 请求URL
+            outcome: 调用方已通过 concurrency.slot 占用并发名额时传入其yield的字典，此时不再重复占用；
+                     流式读取响应体的调用方需要这样做，让名额覆盖整个下载过程
             **kwargs: 请求的其他参数(params, json, data, files等)
 
         Returns:
@@ -95,7 +127,11 @@ class RAGFlowCli:
         if 'headers' not in kwargs:
             kwargs['headers'] = self.headers
 
-        response = requests.request(method, url, **kwargs)
+        if outcome is None:
+            with self.concurrency.slot(self.concurrency.classify(url)) as outcome:
+                response = self._send(method, url, outcome, **kwargs)
+        else:
+            response = self._send(method, url, outcome, **kwargs)
 
         if response.status_code == 200:
             content_type = response.headers.get('content-type')
@@ -143,6 +179,26 @@ class RAGFlowCli:
         #         'status_code': None
         #     }
 
+    @staticmethod
+    def _send(method: str, url: str, outcome: dict, **kwargs) -> requests.Response:
+        """发送请求并把状态码或网络错误记录到并发名额的 outcome 中"""
+        try:
+            response = requests.request(method, url, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            outcome["error"] = True
+            raise
+        outcome["status_code"] = response.status_code
+        return response
+
+    def concurrency_status(self) -> dict:
+        """
+        获取各类接口当前的自适应并发上限
+
+        Returns:
+            dict: {类别: {"limit", "in_flight", "min_limit", "max_limit", "latency_ewma", "successes", "errors"}}
+        """
+        return self.concurrency.status()
+
     def _calculate_file_hash(self, file_path: str) -> str:
         """计算文件的SHA256哈希值"""
         sha256_hash = hashlib.sha256()
@@ -154,82 +210,193 @@ class RAGFlowCli:
     def _download_and_hash(self, doc_id: str) -> Optional[str]:
         """下载文档并计算哈希值"""
         try:
-            result = self.__do_request__(
-                'GET',
-                f"{self.download_url}/{doc_id}",
-                stream=True
-            )
-
-            if result['success']:
-                # 创建临时文件
-                temp_path = f"temp_{doc_id}.pdf"
-                sha256_hash = hashlib.sha256()
-
-                # 边下载边计算哈希值
-                with open(temp_path, 'wb') as f:
-                    for chunk in result['data'].iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            sha256_hash.update(chunk)
-
-                # 删除临时文件
-                os.remove(temp_path)
-                return sha256_hash.hexdigest()
-            return None
+            # 响应体是流式读取的，并发名额要等整个文件读完才归还，否则下载并发不受限制
+            with self.concurrency.slot('download') as outcome:
+                result = self.__do_request__(
+                    'GET',
+                    f"{self.download_url}/{doc_id}",
+                    outcome=outcome,
+                    stream=True
+                )
+
+                if result['success']:
+                    # 创建临时文件
+                    temp_path = f"temp_{doc_id}.pdf"
+                    sha256_hash = hashlib.sha256()
+
+                    # 边下载边计算哈希值
+                    try:
+                        with open(temp_path, 'wb') as f:
+                            for chunk in result['data'].iter_content(chunk_size=8192):
+                                if chunk:
+                                    f.write(chunk)
+                                    sha256_hash.update(chunk)
+                    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                        outcome["error"] = True
+                        raise
+
+                    # 删除临时文件
+                    os.remove(temp_path)
+                    return sha256_hash.hexdigest()
+                return None
         except Exception as e:
             logging.error(f"下载文件时发生错误: {str(e)}", exc_info=True)
             return None
 
-    def sync(self, kb_id: str):
-        """更新本地数据库中的文档信息和哈希值"""
-        docs = self.get_all_documents(kb_id)
+    def sync(self, kb_id: str, force_refresh: bool = False, refresh_manifest: bool = True):
+        """
+        更新本地数据库中的文档信息和哈希值
+        :param kb_id: 知识库ID
+        :param force_refresh: 为True时忽略文档列表缓存，重新从服务端拉取
+        :param refresh_manifest: 同步后是否刷新已导出的清单；批量上传中途的同步传False，由调用方在整批结束后刷新一次
+        """
+        docs = self.get_all_documents(kb_id, force_refresh=force_refresh)
+        self._store_documents(kb_id, docs)
+
+        if refresh_manifest:
+            self.refresh_manifest(kb_id)
 
+    def sync_recent(self, kb_id: str, refresh_manifest: bool = True) -> int:
+        """
+        只同步最近新增的文档：按创建时间倒序逐页拉取，直到某一页中没有本地数据库未记录的文档
+
+        适合刚上传完一批文件后使用，请求数与新增文档数有关，与知识库规模无关；
+        较早文档的状态变化（例如解析进度）不会被同步，需要时使用 sync。
+        :param kb_id: 知识库ID
+        :param refresh_manifest: 同步后是否刷新已导出的清单；刷新需要扫描整个知识库，频繁调用时应传False并按间隔刷新
+        :return: 新增的文档数
+        """
+        added = 0
+        page = 1
+        while True:
+            params = {
+                'kb_id': kb_id,
+                'page_size': 100,
+                'page': page,
+                'orderby': 'create_time',
+                'desc': True
+            }
+            result = self.__do_request__('GET', self.search_url, params=params)
+            if not result['success']:
+                logging.error(f"获取文档列表失败: {result.get('error')}")
+                break
+            docs = result['data'].get('data', {}).get('docs', [])
+            if not docs:
+                break
+            new_count = self._store_documents(kb_id, docs)
+            added += new_count
+            if new_count == 0:
+                break
+            page += 1
+
+        if refresh_manifest:
+            self.refresh_manifest(kb_id)
+        return added
+
+    def _store_documents(self, kb_id: str, docs: list) -> int:
+        """
+        把服务端返回的文档写入本地数据库，新文档下载后计算哈希值
+        :return: 本地数据库中原本没有记录的文档数
+        """
         conn = sqlite3.connect(self.db_path)
         c = conn.cursor()
-        total = len(docs)
 
-        for i, doc in enumerate(docs, 1):
-            p = i / total * 100
-            doc_id = doc.get('id')
+        updated = []
+        new_docs = []
+        for doc in docs:
             # 检查是否需要更新文档信息
-            c.execute('SELECT update_date FROM documents WHERE doc_id = ?', (doc_id,))
+            c.execute('SELECT update_date, file_hash FROM documents WHERE doc_id = ?', (doc.get('id'),))
             result = c.fetchone()
-            doc_update_date = doc.get('update_date')
-
-            if not result or result[0] != doc_update_date:
-                logging.info(f"{p:.2f}% ({i}/{total}) 正在处理文档: {doc.get('name')}")
-                # 计算文件哈希值（如果需要）
-                file_hash = None
-                if not result:  # 新文档才需要下载计算哈希值
-                    file_hash = self._download_and_hash(doc_id)
-
-                if file_hash or result:  # 新文档有哈希值或是更新已有文档
-                    c.execute('''INSERT OR REPLACE INTO documents 
-                                (doc_id, kb_id, name, file_hash, create_date,
-                                 status, process_msg, process, size, source_type,
-                                 chunk_num, update_date)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                              (doc_id, kb_id, doc.get('name'),
-                               file_hash if file_hash else result[0],  # 保留原有哈希值
-                               doc.get('create_date'),
-                               str(doc.get('status')),
-                               doc.get('progress_msg'),
-                               str(doc.get('progress', 0)),
-                               doc.get('size'),
-                               doc.get('source_type'),
-                               doc.get('chunk_num'),
-                               doc_update_date))
-                    conn.commit()
+            if not result:
+                new_docs.append(doc)
+            elif result[0] != doc.get('update_date'):
+                updated.append((doc, result[1]))  # 保留原有哈希值
+
+        def save(doc: dict, file_hash: str):
+            c.execute('''INSERT OR REPLACE INTO documents 
+                        (doc_id, kb_id, name, file_hash, create_date,
+                         status, process_msg, process, size, source_type,
+                         chunk_num, update_date)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (doc.get('id'), kb_id, doc.get('name'),
+                       file_hash,
+                       doc.get('create_date'),
+                       str(doc.get('status')),
+                       doc.get('progress_msg'),
+                       str(doc.get('progress', 0)),
+                       doc.get('size'),
+                       doc.get('source_type'),
+                       doc.get('chunk_num'),
+                       doc.get('update_date')))
+            conn.commit()
+
+        for doc, file_hash in updated:
+            save(doc, file_hash)
+
+        # 新文档需要下载计算哈希值，下载并发由自适应并发控制器的当前上限决定
+        total = len(new_docs)
+        downloads = self.concurrency.map('download', lambda doc: self._download_and_hash(doc.get('id')), new_docs)
+        for i, (doc, file_hash) in enumerate(downloads, 1):
+            p = i / total * 100
+            logging.info(f"{p:.2f}% ({i}/{total}) 已处理文档: {doc.get('name')}")
+            if file_hash:
+                save(doc, file_hash)
 
         conn.close()
+        return total
+
+    def manifest_path(self, kb_id: str) -> str:
+        """知识库清单文件的默认路径"""
+        return os.path.join(MANIFEST_DIR, f"{kb_id}.manifest")
+
+    def export_manifest(self, kb_id: str, path: str = None, force: bool = False) -> dict:
+        """
+        将本地数据库中知识库的 (file_hash → doc_id, status) 导出为排序后的二进制清单文件
+
+        Args:
+            kb_id: 知识库ID
+            path: 清单文件路径，默认为 manifest_path(kb_id)
+            force: 为True时即使内容未变化也重建
+
+        Returns:
+            dict: {"updated": 是否重写了文件, "count": 记录数, "path": 文件路径}
+        """
+        path = path or self.manifest_path(kb_id)
+        result = write_manifest(self.db_path, kb_id, path, force=force)
+        if result["updated"]:
+            logging.info(f"知识库清单已更新: {path}（{result['count']} 条记录）")
+        return result
+
+    def refresh_manifest(self, kb_id: str) -> Optional[dict]:
+        """
+        已经导出过清单的知识库刷新清单（指纹未变化时不会重写），未导出过时不做任何事
+        :return: export_manifest 的结果，未导出过清单时返回None
+        """
+        if os.path.exists(self.manifest_path(kb_id)):
+            return self.export_manifest(kb_id)
+        return None
+
+    def open_manifest(self, kb_id: str, path: str = None) -> ManifestReader:
+        """
+        以只读mmap方式打开知识库清单，可供多个进程共享使用；清单属于其他知识库时抛出ValueError
+        """
+        return ManifestReader(path or self.manifest_path(kb_id), kb_id=kb_id)
 
-    def check_file_exists(self, kb_id: str, file_path: str) -> bool:
+    def check_file_exists(self, kb_id: str, file_path: str, manifest: ManifestReader = None) -> bool:
         """
         检查文件是否已经存在于知识库中（基于文件哈希值）
+        :param kb_id: 知识库ID
+        :param file_path: 文件路径
+        :param manifest: 已打开的知识库清单，提供时直接在清单中二分查找，不访问数据库；清单属于其他知识库时抛出ValueError
         """
+        if manifest is not None and manifest.kb_id != kb_id:
+            raise ValueError(f"清单文件属于知识库 {manifest.kb_id}，不是 {kb_id}: {manifest.path}")
         try:
             file_hash = self._calculate_file_hash(file_path)
 
+            if manifest is not None:
+                return file_hash in manifest
+
             conn = sqlite3.connect(self.db_path)
             c = conn.cursor()
             c.execute('SELECT doc_id FROM documents WHERE kb_id = ? AND file_hash = ?',
@@ -242,13 +409,21 @@ class RAGFlowCli:
             print(f"检查文件哈希值时发生错误: {str(e)}")
             return False
 
-    def get_all_documents(self, kb_id: str):
+    def get_all_documents(self, kb_id: str, force_refresh: bool = False):
         """
         获取知识库中的所有文档
         :param kb_id: 知识库ID
+        :param force_refresh: 为True时忽略缓存，重新从服务端拉取
         :return: 文档列表
         """
+        if not force_refresh:
+            cached = self.listing_cache.get(kb_id)
+            if cached is not None:
+                logging.debug(f"使用缓存的文档列表: {kb_id}（{len(cached)} 个文档）")
+                return cached
+
         all_docs = []
+        complete = False
         page = 1
         while True:
             params = {
@@ -264,6 +439,7 @@ class RAGFlowCli:
                 if response_data.get('code') == 0:
                     docs = response_data.get('data', {}).get('docs', [])
                     if not docs:  # 如果没有更多文档了
+                        complete = True
                         break
                     all_docs.extend(docs)
                     page += 1
@@ -274,21 +450,35 @@ class RAGFlowCli:
                 print(f"请求失败: {result.get('error')}")
                 break
 
+        # 只缓存完整的列表，拉取中途失败的结果不能代表知识库的真实状态
+        if complete:
+            self.listing_cache.put(kb_id, all_docs)
         return all_docs
 
-    def upload_file(self, kb_id: str, file_path: str):
+    def upload_file(self, kb_id: str, file_path: str, file_hash: str = None, sync_after: bool = True,
+                    cross_kb: str = None):
         """
         上传文件
         :param kb_id: 知识库ID
         :param file_path: 文件路径
-        :return: dict
+        :param file_hash: 已经算好的文件哈希值，避免重复计算
+        :param sync_after: 上传成功后是否立即同步知识库
+        :param cross_kb: 其他知识库中已存在相同内容时的处理方式：None 不检查，"warn" 告警后继续上传，"skip" 跳过上传，
+                         其他取值抛出ValueError
+        :return: dict，网络错误或服务端过载（429/5xx）导致的失败带有 "retryable": True，稍后重试可能成功
         """
+        self._check_cross_kb(cross_kb)
         try:
             if not os.path.exists(file_path):
                 return {"success": False, "message": "文件不存在"}
 
+            # 本地预检，不合格的文件不产生任何网络请求
+            reason, _ = check_file(file_path, self.max_upload_size)
+            if reason is not None:
+                return {"success": False, "message": f"预检未通过: {reason}"}
+
             real_filename = os.path.basename(file_path)
-            file_hash = self._calculate_file_hash(file_path)
+            file_hash = file_hash or self._calculate_file_hash(file_path)
 
             # 检查文件是否已存在（基于哈希值）
             conn = sqlite3.connect(self.db_path)
@@ -309,6 +499,16 @@ class RAGFlowCli:
                     "message": f"文件已存在（文件名：{name}，文档ID：{doc_id}，处理进度：{process * 100}%），跳过上传"
                 }
 
+            cross_kb_note = ""
+            if cross_kb is not None:
+                others = self.find_documents_by_hash(file_hash, exclude_kb_id=kb_id)
+                if others:
+                    locations = "；".join(f"知识库：{other['kb_id']}，文档ID：{other['doc_id']}" for other in others)
+                    if cross_kb == "skip":
+                        return {"success": False, "message": f"其他知识库中已存在相同内容（{locations}），跳过上传"}
+                    logging.warning(f"{file_path} 在其他知识库中已存在相同内容（{locations}）")
+                    cross_kb_note = f"（其他知识库中已存在相同内容：{locations}）"
+
             files = {
                 'file': (real_filename, open(file_path, 'rb'), 'application/pdf')
             }
@@ -320,49 +520,82 @@ class RAGFlowCli:
                 files=files
             )
 
+            if result is None:
+                return {"success": False, "message": "上传失败: 文件超过服务端允许的大小（413）"}
             if result['success']:
                 response_data = result['data']
-                if response_data.get('code') == 9 and response_data.get('data') is True:
-                    self.sync(kb_id)
-                    return {"success": True, "message": "文件上传成功"}
+                if response_data.get('code') == 0 and response_data.get('data'):
+                    # 服务端返回了完整的文档信息时直接写入列表缓存，否则让缓存失效
+                    new_docs = response_data.get('data')
+                    if isinstance(new_docs, list) and all(
+                            isinstance(doc, dict) and 'id' in doc and 'update_date' in doc for doc in new_docs):
+                        self.listing_cache.upsert(kb_id, new_docs)
+                    else:
+                        self.listing_cache.invalidate(kb_id)
+                    if sync_after:
+                        self.sync(kb_id)
+                    return {"success": True, "message": "文件上传成功" + cross_kb_note}
                 else:
                     return {"success": False, "message": f"上传失败: {response_data.get('message')}"}
             else:
-                return {"success": False, "message": f"上传失败: {result.get('error')}"}
+                return {"success": False, "message": f"上传失败: {result.get('error')}",
+                        "retryable": result.get('status_code') in OVERLOAD_STATUS_CODES}
 
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            return {"success": False, "message": f"上传过程发生网络错误: {str(e)}", "retryable": True}
         except Exception as e:
             return {"success": False, "message": f"上传过程发生错误: {str(e)}"}
 
-    def upload_directory(self, kb_id: str, directory_path: str):
+    @staticmethod
+    def _check_cross_kb(cross_kb: Optional[str]):
+        """校验 cross_kb 参数，拼写错误不能悄悄关闭跨知识库检查"""
+        if cross_kb not in (None, "warn", "skip"):
+            raise ValueError(f"不支持的 cross_kb 取值: {cross_kb!r}，可选值为 None、\"warn\"、\"skip\"")
+
+    def upload_directory(self, kb_id: str, directory_path: str, cross_kb: str = None):
         """
         上传指定目录下的所有PDF文件
         :param kb_id: 知识库ID
         :param directory_path: 目录路径
+        :param cross_kb: 其他知识库中已存在相同内容时的处理方式，见 upload_file
         :return: 上传统计结果
         """
+        self._check_cross_kb(cross_kb)
         if not os.path.exists(directory_path):
             return {"success": False, "message": "目录不存在"}
-        self.sync(kb_id)
+        # 清单在整个目录上传结束后只刷新一次
+        self.sync(kb_id, refresh_manifest=False)
         stats = {
             "total": 0,
             "success": 0,
             "failed": 0,
             "failed_files": []
         }
-        logging.info("正在扫描目录.....")
-        pending_files = []
-        # 遍历目录下的所有文件
-        for root, dirs, files in os.walk(directory_path):
-            for file in files:
-                if file.lower().endswith('.pdf'):
-                    pending_files.append(os.path.join(root, file))
+        pending_files, rejected = self._scan_upload_files(directory_path)
+        stats["total"] += len(rejected)
+        stats["failed"] += len(rejected)
+        stats["failed_files"].extend(rejected)
+        # 上传期间不同步数据库，本次上传中内容相同的文件按哈希值在内存中去重
+        seen_hashes = set()
+        seen_lock = threading.Lock()
+
+        def upload(file_path: str) -> dict:
+            try:
+                file_hash = self._calculate_file_hash(file_path)
+            except OSError as e:
+                return {"success": False, "message": f"读取文件失败: {str(e)}"}
+            with seen_lock:
+                if file_hash in seen_hashes:
+                    return {"success": False, "message": "相同内容的文件已在本次上传中处理，跳过上传"}
+                seen_hashes.add(file_hash)
+            return self.upload_file(kb_id, file_path, file_hash=file_hash, sync_after=False, cross_kb=cross_kb)
+
+        # 上传并发由自适应并发控制器的当前上限决定
         total = len(pending_files)
-        logging.info(f"扫描已完成：{total}")
-        for i, file_path in enumerate(pending_files, start=1):
+        for i, (file_path, result) in enumerate(self.concurrency.map('upload', upload, pending_files), start=1):
             p = i / total * 100
             stats["total"] += 1
-            logging.info(f"{p:.2f}%({i}/{total}) 正在上传: {file_path}")
-            result = self.upload_file(kb_id, file_path)
+            logging.info(f"{p:.2f}%({i}/{total}) 已处理: {file_path}")
             if result["success"]:
                 stats["success"] += 1
             else:
@@ -372,7 +605,38 @@ class RAGFlowCli:
                     "error": result["message"]
                 })
 
-        # 生成上传报告
+        # 全部上传结束后同步一次数据库并刷新清单
+        if stats["success"]:
+            self.sync(kb_id)
+        else:
+            self.refresh_manifest(kb_id)
+        return {"success": True, "message": self._format_upload_report(stats), "stats": stats}
+
+    def _scan_upload_files(self, directory_path: str):
+        """
+        扫描目录下的PDF文件并做上传前预检
+        :return: (按大小交错排好序的待上传文件列表, 预检未通过的文件列表)
+        """
+        logging.info("正在扫描目录.....")
+        pending_files = []
+        # 遍历目录下的所有文件
+        for root, dirs, files in os.walk(directory_path):
+            for file in files:
+                if file.lower().endswith('.pdf'):
+                    pending_files.append(os.path.join(root, file))
+        logging.info(f"扫描已完成：{len(pending_files)}")
+
+        # 预检：过大、空文件、文件头不符或被截断的PDF直接记为失败，不上传
+        accepted, rejected = preflight(pending_files, self.max_upload_size)
+        if rejected:
+            logging.warning(f"预检未通过的文件数：{len(rejected)}")
+
+        # 大小文件交错上传，避免大文件扎堆堵塞队列
+        return schedule_by_size(accepted), rejected
+
+    @staticmethod
+    def _format_upload_report(stats: dict) -> str:
+        """生成上传报告"""
         report = (
             f"上传完成！\n"
             f"总文件数: {stats['total']}\n"
@@ -385,105 +649,286 @@ class RAGFlowCli:
             for failed in stats["failed_files"]:
                 report += f"文件: {failed['file']}\n"
                 report += f"错误: {failed['error']}\n"
+        return report
 
-        return {"success": True, "message": report, "stats": stats}
+    def upload_directory_parallel(self, kb_id: str, directory_path: str, workers: int = 4,
+                                  job_id: str = None, lease_seconds: float = 300, retry_failed: bool = False,
+                                  cross_kb: str = None):
+        """
+        启动多个工作进程协同上传目录下的所有PDF文件
 
-    def check_duplicates(self, kb_id: str) -> str:
+        任务登记在SQLite的租约队列中，其他机器可以用相同的 job_id 调用 work_upload_queue 加入同一次上传，
+        前提是共享同一个数据库（db_path）且文件路径一致。
+        :param kb_id: 知识库ID
+        :param directory_path: 目录路径
+        :param workers: 本机启动的工作进程数
+        :param job_id: 任务ID，默认由知识库ID和目录绝对路径生成，重复执行同一目录会续传
+        :param lease_seconds: 租约时长（秒）
+        :param retry_failed: 是否重试上一次失败的文件
+        :param cross_kb: 其他知识库中已存在相同内容时的处理方式，见 upload_file
+        :return: 上传统计结果，格式与 upload_directory 一致
         """
-        检查知识库中的重复文档（基于文件哈希值）
+        # 在启动工作进程之前校验，避免每个工作进程各自报错
+        self._check_cross_kb(cross_kb)
+        if not os.path.exists(directory_path):
+            return {"success": False, "message": "目录不存在"}
+        # 清单在最后一次同步时刷新
+        self.sync(kb_id, refresh_manifest=False)
+        if job_id is None:
+            job_id = hashlib.sha256(f"{kb_id}:{os.path.abspath(directory_path)}".encode("utf-8")).hexdigest()[:16]
+
+        pending_files, rejected = self._scan_upload_files(directory_path)
+        queue = UploadQueue(self.db_path, lease_seconds=lease_seconds)
+        added = queue.enqueue(job_id, kb_id, pending_files, retry_failed=retry_failed)
+        logging.info(f"任务 {job_id} 新登记文件数：{added}，待处理：{queue.remaining(job_id)}")
+
+        ctx = multiprocessing.get_context("spawn")
+        processes = []
+        for i in range(workers):
+            process = ctx.Process(
+                target=_upload_worker_main,
+                name=f"UploadWorker-{i}",
+                args=(self.headers['Authorization'], self.base_url, self.db_path, self.max_upload_size,
+                      kb_id, job_id, lease_seconds, cross_kb)
+            )
+            process.start()
+            processes.append(process)
+        for process in processes:
+            process.join()
+
+        stats = queue.stats(job_id)
+        stats["total"] += len(rejected)
+        stats["failed"] += len(rejected)
+        stats["failed_files"].extend(rejected)
+        # 工作进程上传时不做同步，结束后统一同步一次；工作进程的写入不经过本进程的缓存，必须重新拉取
+        self.sync(kb_id, force_refresh=True)
+        return {"success": True, "message": self._format_upload_report(stats), "stats": stats, "job_id": job_id}
+
+    def work_upload_queue(self, kb_id: str, job_id: str, lease_seconds: float = 300, poll_interval: float = 5,
+                          cross_kb: str = None) -> dict:
+        """
+        作为工作进程处理租约队列中的上传任务，直到队列中没有未完成的任务
         :param kb_id: 知识库ID
-        :return: 重复文档报告
+        :param job_id: 任务ID
+        :param lease_seconds: 租约时长（秒）
+        :param poll_interval: 暂时没有可领取的任务时的等待间隔（秒）
+        :param cross_kb: 其他知识库中已存在相同内容时的处理方式，见 upload_file
+        :return: 本进程的处理统计
         """
-        # 首先确保本地数据库是最新的
-        self.sync(kb_id)
-
+        self._check_cross_kb(cross_kb)
+        queue = UploadQueue(self.db_path, lease_seconds=lease_seconds)
+        owner = new_owner_id()
+        stats = {"success": 0, "failed": 0, "deferred": 0}
+        with Heartbeat(queue, job_id, owner):
+            while True:
+                file_path = queue.claim(job_id, owner)
+                if file_path is None:
+                    # 其他进程持有的租约可能过期，等到所有任务都完成再退出
+                    if queue.remaining(job_id) == 0:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                try:
+                    file_hash = self._calculate_file_hash(file_path)
+                except OSError as e:
+                    queue.complete(job_id, file_path, owner, False, f"读取文件失败: {str(e)}")
+                    stats["failed"] += 1
+                    continue
+
+                claim = queue.claim_hash(job_id, file_hash, file_path)
+                if claim == "busy":
+                    # 相同内容的文件正在由其他进程上传，等它出结果再决定
+                    queue.defer(job_id, file_path, owner, poll_interval)
+                    stats["deferred"] += 1
+                    continue
+                if claim == "uploaded":
+                    queue.complete(job_id, file_path, owner, True, "文件上传成功", file_hash)
+                    stats["success"] += 1
+                    continue
+                if claim == "done":
+                    queue.complete(job_id, file_path, owner, False, "相同内容的文件已在本次任务中上传，跳过上传", file_hash)
+                    stats["failed"] += 1
+                    continue
+                if claim == "verify":
+                    # 上一个持有者发出上传请求后没有记录结果就崩溃了，服务端可能已经收到文件，先核对再决定是否重传
+                    self.sync(kb_id, force_refresh=True, refresh_manifest=False)
+                    if self._find_document(kb_id, file_hash) is not None:
+                        logging.info(f"[{owner}] 服务端已存在，不再重复上传: {file_path}")
+                        queue.release_hash(job_id, file_hash, done=True)
+                        queue.complete(job_id, file_path, owner, True, "文件上传成功", file_hash)
+                        stats["success"] += 1
+                        continue
+
+                logging.info(f"[{owner}] 正在上传: {file_path}")
+                queue.mark_uploading(job_id, file_hash)
+                result = self.upload_file(kb_id, file_path, file_hash=file_hash, sync_after=False,
+                                          cross_kb=cross_kb)
+                queue.release_hash(job_id, file_hash, done=result["success"])
+                queue.complete(job_id, file_path, owner, result["success"], result["message"], file_hash)
+                stats["success" if result["success"] else "failed"] += 1
+        return stats
+
+    def _find_document(self, kb_id: str, file_hash: str) -> Optional[str]:
+        """在本地数据库中按哈希值查找知识库中的文档，返回文档ID"""
         conn = sqlite3.connect(self.db_path)
         c = conn.cursor()
+        c.execute('SELECT doc_id FROM documents WHERE kb_id = ? AND file_hash = ?', (kb_id, file_hash))
+        row = c.fetchone()
+        conn.close()
+        return row[0] if row else None
 
-        # 查找具有相同哈希值的文档，并按重复数量降序排序
-        c.execute('''
-            WITH duplicate_counts AS (
-                SELECT file_hash, COUNT(*) as count
-                FROM documents 
-                WHERE kb_id = ?
-                GROUP BY file_hash 
-                HAVING count > 1
-                ORDER BY count DESC
-            )
-            SELECT 
-                d.file_hash,
-                GROUP_CONCAT(d.name) as names,
-                GROUP_CONCAT(d.doc_id) as doc_ids,
-                GROUP_CONCAT(d.create_date) as dates,
-                GROUP_CONCAT(d.status) as statuses,
-                GROUP_CONCAT(d.process) as processes,
-                GROUP_CONCAT(d.size) as sizes,
-                dc.count
-            FROM documents d
-            JOIN duplicate_counts dc ON d.file_hash = dc.file_hash
-            GROUP BY d.file_hash
-        ''', (kb_id,))
+    def iter_duplicate_groups(self, kb_id: str, after_hash: str = None, limit: int = None):
+        """
+        逐组返回知识库中的重复文档（基于本地数据库中的文件哈希值，不会先同步）
 
-        duplicates = c.fetchall()
+        直接从游标按哈希值顺序读取，不做字符串拼接，内存占用只与单组大小有关。
+        :param kb_id: 知识库ID
+        :param after_hash: 只返回哈希值大于该值的重复组，用于分页
+        :param limit: 最多返回的重复组数，为None时不限制
+        :return: 生成器，每组为 {"file_hash", "count", "docs": [...]}，组内文档按处理进度降序排列
+        """
+        # 分页条件只在需要时拼接，让SQLite直接在 (kb_id, file_hash) 索引上定位起点
+        params = [kb_id, kb_id]
+        after_clause = ""
+        if after_hash is not None:
+            after_clause = "AND file_hash > ?"
+            params.append(after_hash)
+        params.append(-1 if limit is None else limit)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            c = conn.cursor()
+            c.execute(f'''
+                SELECT d.file_hash, d.doc_id, d.name, d.create_date, d.status, d.process, d.size
+                FROM documents d
+                WHERE d.kb_id = ? AND d.file_hash IN (
+                    SELECT file_hash
+                    FROM documents
+                    WHERE kb_id = ? AND file_hash IS NOT NULL {after_clause}
+                    GROUP BY file_hash
+                    HAVING COUNT(*) > 1
+                    ORDER BY file_hash
+                    LIMIT ?
+                )
+                ORDER BY d.file_hash
+            ''', params)
+            for file_hash, rows in itertools.groupby(c, key=lambda row: row[0]):
+                docs = [{
+                    'doc_id': doc_id,
+                    'name': name,
+                    'date': create_date,
+                    'status': status,
+                    'process': float(process or 0),  # 处理空值情况
+                    'size': int(size or 0)
+                } for _, doc_id, name, create_date, status, process, size in rows]
+                # 按处理进度降序排序
+                docs.sort(key=lambda x: x['process'], reverse=True)
+                yield {"file_hash": file_hash, "count": len(docs), "docs": docs}
+        finally:
+            conn.close()
 
-        # 获取知识库中的总文档数
+    def _duplicate_summary(self, kb_id: str):
+        """返回 (知识库总文档数, 重复文档组数)"""
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
         c.execute('SELECT COUNT(*) FROM documents WHERE kb_id = ?', (kb_id,))
         total_docs = c.fetchone()[0]
+        c.execute('''
+            SELECT COUNT(*) FROM (
+                SELECT file_hash
+                FROM documents
+                WHERE kb_id = ? AND file_hash IS NOT NULL
+                GROUP BY file_hash
+                HAVING COUNT(*) > 1
+            )
+        ''', (kb_id,))
+        total_groups = c.fetchone()[0]
+        conn.close()
+        return total_docs, total_groups
 
-        # 生成报告
-        report = []
-        report.append(f"知识库文档查重报告")
-        report.append(f"总文档数: {total_docs}")
-        report.append(f"发现重复文档组数: {len(duplicates)}")
-
-        if duplicates:
-            report.append("\n重复文档详情:")
-            for file_hash, names, doc_ids, dates, statuses, processes, sizes, count in duplicates:
-                report.append(f"\n文件哈希值: {file_hash}")
-                report.append(f"重复数量: {count}")
-
-                # 将组合字符串分割成列表并创建文档信息元组列表
-                doc_infos = []
-                name_list = names.split(',')
-                doc_id_list = doc_ids.split(',')
-                date_list = dates.split(',')
-                status_list = statuses.split(',')
-                process_list = processes.split(',')
-                size_list = sizes.split(',')
-
-                for i in range(count):
-                    doc_infos.append({
-                        'doc_id': doc_id_list[i],
-                        'name': name_list[i],
-                        'date': date_list[i],
-                        'status': status_list[i],
-                        'process': float(process_list[i] or 0),  # 处理空值情况
-                        'size': int(size_list[i])
-                    })
+    def iter_duplicate_report_lines(self, kb_id: str):
+        """
+        逐行生成文本格式的重复文档报告（基于本地数据库，不会先同步）
+        :param kb_id: 知识库ID
+        :return: 生成器，每次产出一行
+        """
+        status_map = {
+            "0": "待处理",
+            "1": "处理完成",
+            "-1": "处理失败"
+        }
+        total_docs, total_groups = self._duplicate_summary(kb_id)
+        yield f"知识库文档查重报告"
+        yield f"总文档数: {total_docs}"
+        yield f"发现重复文档组数: {total_groups}"
+
+        if not total_groups:
+            yield "\n未发现重复文档！"
+            return
+
+        yield "\n重复文档详情:"
+        for group in self.iter_duplicate_groups(kb_id):
+            yield f"\n文件哈希值: {group['file_hash']}"
+            yield f"重复数量: {group['count']}"
+            yield "重复实例:"
+            for doc in group["docs"]:
+                status = status_map.get(doc['status'], "未知状态")
+                yield f"  - 文档ID: {doc['doc_id']}"
+                yield f"    文件名: {doc['name']}"
+                yield f"    创建时间: {doc['date']}"
+                yield f"    处理状态: {status}"
+                yield f"    处理进度: {doc['process'] * 100}%"
+                yield f"    文件大小: {doc['size']:,} 字节"
+
+    def write_duplicate_report(self, kb_id: str, path: str, fmt: str = None, force_refresh: bool = False) -> int:
+        """
+        将重复文档报告边生成边写入文件，适合文档数量很大的知识库和下游工具处理
+        :param kb_id: 知识库ID
+        :param path: 输出文件路径
+        :param fmt: "jsonl"（每行一个重复组）、"csv"（每行一个文档）或 "text"，默认按扩展名判断
+        :param force_refresh: 为True时忽略文档列表缓存，重新从服务端拉取
+        :return: 写入的重复文档组数
+        """
+        if fmt is None:
+            fmt = {".jsonl": "jsonl", ".csv": "csv"}.get(os.path.splitext(path)[1].lower(), "text")
+        if fmt not in ("jsonl", "csv", "text"):
+            raise ValueError(f"不支持的报告格式: {fmt}")
 
-                # 按处理进度降序排序
-                doc_infos.sort(key=lambda x: x['process'], reverse=True)
-
-                report.append("重复实例:")
-                for doc in doc_infos:
-                    status_map = {
-                        "0": "待处理",
-                        "1": "处理完成",
-                        "-1": "处理失败"
-                    }
-                    status = status_map.get(doc['status'], "未知状态")
-
-                    report.append(f"  - 文档ID: {doc['doc_id']}")
-                    report.append(f"    文件名: {doc['name']}")
-                    report.append(f"    创建时间: {doc['date']}")
-                    report.append(f"    处理状态: {status}")
-                    report.append(f"    处理进度: {doc['process'] * 100}%")
-                    report.append(f"    文件大小: {doc['size']:,} 字节")
-        else:
-            report.append("\n未发现重复文档！")
+        # 首先确保本地数据库是最新的
+        self.sync(kb_id, force_refresh=force_refresh)
+
+        groups = 0
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            if fmt == "text":
+                for line in self.iter_duplicate_report_lines(kb_id):
+                    f.write(line + "\n")
+                return self._duplicate_summary(kb_id)[1]
+
+            writer = None
+            if fmt == "csv":
+                writer = csv.writer(f)
+                writer.writerow(["file_hash", "count", "rank", "doc_id", "name", "date", "status", "process", "size"])
+            for group in self.iter_duplicate_groups(kb_id):
+                groups += 1
+                if fmt == "jsonl":
+                    f.write(json.dumps({"kb_id": kb_id, **group}, ensure_ascii=False) + "\n")
+                else:
+                    # rank 为组内按处理进度排序后的位置，0 即去重时会保留的文档
+                    for rank, doc in enumerate(group["docs"]):
+                        writer.writerow([group["file_hash"], group["count"], rank, doc["doc_id"], doc["name"],
+                                         doc["date"], doc["status"], doc["process"], doc["size"]])
+        return groups
 
-        conn.close()
-        return "\n".join(report)
+    def check_duplicates(self, kb_id: str, force_refresh: bool = False) -> str:
+        """
+        检查知识库中的重复文档（基于文件哈希值）
+        :param kb_id: 知识库ID
+        :param force_refresh: 为True时忽略文档列表缓存，重新从服务端拉取
+        :return: 重复文档报告
+        """
+        # 首先确保本地数据库是最新的
+        self.sync(kb_id, force_refresh=force_refresh)
+        return "\n".join(self.iter_duplicate_report_lines(kb_id))
 
     def get_duplicate_groups(self, kb_id: str) -> list:
         """
@@ -491,26 +936,115 @@ class RAGFlowCli:
         :param kb_id: 知识库ID
         :return: 重复文档组列表
         """
+        return [{
+            'hash': group['file_hash'],
+            'doc_ids': [doc['doc_id'] for doc in group['docs']]
+        } for group in self.iter_duplicate_groups(kb_id)]
+
+    def find_documents_by_hash(self, file_hash: str, exclude_kb_id: str = None) -> list:
+        """
+        在本地数据库记录的所有知识库中按内容哈希查找文档（只包含同步过的知识库）
+        :param file_hash: 文件哈希值
+        :param exclude_kb_id: 排除的知识库ID
+        :return: [{"kb_id", "doc_id", "name"}]
+        """
         conn = sqlite3.connect(self.db_path)
         c = conn.cursor()
+        c.execute('SELECT kb_id, doc_id, name FROM documents WHERE file_hash = ? AND kb_id IS NOT ?',
+                  (file_hash, exclude_kb_id))
+        docs = [{"kb_id": kb_id, "doc_id": doc_id, "name": name} for kb_id, doc_id, name in c.fetchall()]
+        conn.close()
+        return docs
 
-        c.execute('''
-            SELECT file_hash, GROUP_CONCAT(doc_id) as doc_ids
-            FROM documents 
-            WHERE kb_id = ?
-            GROUP BY file_hash 
-            HAVING COUNT(*) > 1
-        ''', (kb_id,))
+    def iter_cross_kb_duplicates(self):
+        """
+        逐组返回出现在多个知识库中的相同内容（只包含同步过的知识库）
 
-        duplicate_groups = []
-        for file_hash, doc_ids in c.fetchall():
-            duplicate_groups.append({
-                'hash': file_hash,
-                'doc_ids': doc_ids.split(',')
-            })
+        借助 (file_hash, kb_id) 索引，分组和排序都是对索引的顺序扫描，耗时与文档总数近似线性，
+        结果边读游标边产出，内存占用只与单组大小有关。
+        :return: 生成器，每组为 {"file_hash", "kb_count", "doc_count", "size", "docs": [...]}
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            c = conn.cursor()
+            c.execute('''
+                SELECT d.file_hash, d.kb_id, d.doc_id, d.name, d.size, d.status, d.chunk_num
+                FROM documents d
+                WHERE d.file_hash IN (
+                    SELECT file_hash
+                    FROM documents
+                    WHERE file_hash IS NOT NULL
+                    GROUP BY file_hash
+                    HAVING COUNT(DISTINCT kb_id) > 1
+                )
+                ORDER BY d.file_hash, d.kb_id
+            ''')
+            for file_hash, rows in itertools.groupby(c, key=lambda row: row[0]):
+                docs = [{
+                    "kb_id": kb_id,
+                    "doc_id": doc_id,
+                    "name": name,
+                    "size": size,
+                    "status": status,
+                    "chunk_num": chunk_num
+                } for _, kb_id, doc_id, name, size, status, chunk_num in rows]
+                yield {
+                    "file_hash": file_hash,
+                    "kb_count": len({doc["kb_id"] for doc in docs}),
+                    "doc_count": len(docs),
+                    "size": docs[0]["size"],
+                    "docs": docs
+                }
+        finally:
+            conn.close()
 
+    def _cross_kb_summary(self):
+        """返回 (跨知识库重复内容组数, 重复副本总大小)"""
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        # 每份内容只需保留一份，其余副本的解析和向量化都是重复开销
+        c.execute('''
+            SELECT COUNT(*), SUM(size * (doc_count - 1)) FROM (
+                SELECT MAX(size) AS size, COUNT(*) AS doc_count
+                FROM documents
+                WHERE file_hash IS NOT NULL
+                GROUP BY file_hash
+                HAVING COUNT(DISTINCT kb_id) > 1
+            )
+        ''')
+        groups, wasted_size = c.fetchone()
         conn.close()
-        return duplicate_groups
+        return groups, wasted_size or 0
+
+    def iter_cross_kb_report_lines(self):
+        """
+        逐行生成跨知识库的重复内容报告（基于本地数据库中已同步的知识库）
+        :return: 生成器，每次产出一行
+        """
+        groups, wasted_size = self._cross_kb_summary()
+        yield "跨知识库重复内容报告"
+        yield f"发现跨知识库重复内容组数: {groups}"
+        if not groups:
+            yield "\n未发现跨知识库的重复内容！"
+            return
+
+        yield f"重复副本总大小: {wasted_size:,} 字节"
+        yield "\n重复内容详情:"
+        for group in self.iter_cross_kb_duplicates():
+            yield f"\n文件哈希值: {group['file_hash']}"
+            yield f"涉及知识库数: {group['kb_count']}，文档数: {group['doc_count']}"
+            for doc in group["docs"]:
+                yield f"  - 知识库ID: {doc['kb_id']}"
+                yield f"    文档ID: {doc['doc_id']}"
+                yield f"    文件名: {doc['name']}"
+                yield f"    分块数量: {doc['chunk_num']}"
+
+    def check_cross_kb_duplicates(self) -> str:
+        """
+        生成跨知识库的重复内容报告（基于本地数据库中已同步的知识库）
+        :return: 重复内容报告
+        """
+        return "\n".join(self.iter_cross_kb_report_lines())
 
     def delete_document(self, doc_id: str) -> bool:
         """
@@ -534,124 +1068,102 @@ class RAGFlowCli:
                     c.execute('DELETE FROM documents WHERE doc_id = ?', (doc_id,))
                     conn.commit()
                     conn.close()
+                    self.listing_cache.remove([doc_id])
                     return True
             return False
         except Exception as e:
             print(f"删除文档时发生错误: {str(e)}")
             return False
 
-    def clean_duplicates(self, kb_id: str) -> str:
+    def clean_duplicates(self, kb_id: str, force_refresh: bool = False, report_path: str = None,
+                         page_size: int = 500) -> str:
         """
         清理重复文档，保留解析进度最高的版本
         :param kb_id: 知识库ID
-        :return: 清理报告
+        :param force_refresh: 为True时忽略文档列表缓存，重新从服务端拉取
+        :param report_path: 提供时把清理详情边清理边写入该文件（汇总在文件末尾），只返回汇总，内存占用与重复组数无关
+        :param page_size: 每次从数据库读取并清理的重复组数
+        :return: 清理报告（提供 report_path 时只包含汇总）
         """
-        # 首先确保本地数据库是最新的
-        self.sync(kb_id)
-
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        # 查找重复文档组
-        c.execute('''
-            WITH duplicate_counts AS (
-                SELECT file_hash, COUNT(*) as count
-                FROM documents 
-                WHERE kb_id = ?
-                GROUP BY file_hash 
-                HAVING count > 1
-            )
-            SELECT 
-                d.file_hash,
-                GROUP_CONCAT(d.doc_id) as doc_ids,
-                GROUP_CONCAT(d.name) as names,
-                GROUP_CONCAT(d.process) as processes
-            FROM documents d
-            JOIN duplicate_counts dc ON d.file_hash = dc.file_hash
-            GROUP BY d.file_hash
-        ''', (kb_id,))
-
-        duplicates = c.fetchall()
+        # 首先确保本地数据库是最新的；清理会删除数据库记录，清单在清理结束后再刷新
+        self.sync(kb_id, force_refresh=force_refresh, refresh_manifest=False)
 
         # 清理统计
         stats = {
-            "total_groups": len(duplicates),
+            "total_groups": 0,
             "total_deleted": 0,
-            "failed_deletes": [],
-            "details": []
+            "failed_deletes": 0
         }
+        details = self._iter_clean_duplicates(kb_id, stats, page_size)
+
+        if report_path is None:
+            detail_lines = list(details)
+            report = self._clean_summary_lines(stats)
+            if detail_lines:
+                report.append("\n清理详情:")
+                report.extend(detail_lines)
+        else:
+            with open(report_path, 'w', encoding='utf-8') as f:
+                f.write("清理详情:\n")
+                for line in details:
+                    f.write(line + "\n")
+                f.write("\n" + "\n".join(self._clean_summary_lines(stats)) + "\n")
+            report = self._clean_summary_lines(stats)
+            report.append(f"清理详情已写入: {report_path}")
+
+        self.refresh_manifest(kb_id)
+        return "\n".join(report)
 
-        for file_hash, doc_ids, names, processes in duplicates:
-            doc_id_list = doc_ids.split(',')
-            name_list = names.split(',')
-            process_list = [float(p or 0) for p in processes.split(',')]
-
-            # 将文档信息组合成列表并按处理进度排序
-            docs = list(zip(doc_id_list, name_list, process_list))
-            docs.sort(key=lambda x: x[2], reverse=True)  # 按进度降序排序
-
-            # 保留进度最高的文档，删除其他的
-            kept_doc = docs[0]
-            docs_to_delete = docs[1:]
-
-            group_detail = {
-                "file_hash": file_hash,
-                "kept_doc": {
-                    "id": kept_doc[0],
-                    "name": kept_doc[1],
-                    "progress": kept_doc[2]
-                },
-                "deleted_docs": []
-            }
-
-            for doc_id, name, progress in docs_to_delete:
-                if self.delete_document(doc_id):
-                    stats["total_deleted"] += 1
-                    group_detail["deleted_docs"].append({
-                        "id": doc_id,
-                        "name": name,
-                        "progress": progress,
-                        "status": "成功"
-                    })
-                else:
-                    stats["failed_deletes"].append(doc_id)
-                    group_detail["deleted_docs"].append({
-                        "id": doc_id,
-                        "name": name,
-                        "progress": progress,
-                        "status": "失败"
-                    })
-
-            stats["details"].append(group_detail)
-
-        conn.close()
-
-        # 生成报告
+    @staticmethod
+    def _clean_summary_lines(stats: dict) -> list:
+        """清理报告的汇总部分"""
         report = []
         report.append("重复文档清理报告")
         report.append(f"重复文档组数: {stats['total_groups']}")
         report.append(f"已删除文档数: {stats['total_deleted']}")
         if stats["failed_deletes"]:
-            report.append(f"删除失败数: {len(stats['failed_deletes'])}")
-
-        if stats["details"]:
-            report.append("\n清理详情:")
-            for detail in stats["details"]:
-                report.append(f"\n文件哈希值: {detail['file_hash']}")
-                report.append("保留的文档:")
-                report.append(f"  - ID: {detail['kept_doc']['id']}")
-                report.append(f"    文件名: {detail['kept_doc']['name']}")
-                report.append(f"    处理进度: {detail['kept_doc']['progress'] * 100}%")
-
-                if detail["deleted_docs"]:
-                    report.append("删除的文档:")
-                    for doc in detail["deleted_docs"]:
-                        report.append(f"  - ID: {doc['id']}")
-                        report.append(f"    文件名: {doc['name']}")
-                        report.append(f"    处理进度: {doc['progress'] * 100}%")
-                        report.append(f"    状态: {doc['status']}")
+            report.append(f"删除失败数: {stats['failed_deletes']}")
+        return report
 
-        return "\n".join(report)
+    def _iter_clean_duplicates(self, kb_id: str, stats: dict, page_size: int):
+        """
+        按哈希值分页读取重复组并删除多余的文档，逐行产出清理详情，同时累加 stats 中的计数
+
+        每页读完后关闭读游标再删除，删除时不与读游标争用数据库锁；
+        删除后组内只剩保留的文档，下一页从本页最后一个哈希值之后继续。
+        """
+        after_hash = None
+        while True:
+            groups = list(self.iter_duplicate_groups(kb_id, after_hash=after_hash, limit=page_size))
+            if not groups:
+                return
+            after_hash = groups[-1]["file_hash"]
+
+            # 并发删除，并发数由自适应并发控制器的当前上限决定；组内文档已按处理进度降序排列
+            to_delete = [doc['doc_id'] for group in groups for doc in group["docs"][1:]]
+            deleted = dict(self.concurrency.map('rm', self.delete_document, to_delete))
+
+            for group in groups:
+                stats["total_groups"] += 1
+                # 保留进度最高的文档，删除其他的
+                kept_doc = group["docs"][0]
+                yield f"\n文件哈希值: {group['file_hash']}"
+                yield "保留的文档:"
+                yield f"  - ID: {kept_doc['doc_id']}"
+                yield f"    文件名: {kept_doc['name']}"
+                yield f"    处理进度: {kept_doc['process'] * 100}%"
+
+                if len(group["docs"]) > 1:
+                    yield "删除的文档:"
+                for doc in group["docs"][1:]:
+                    if deleted[doc['doc_id']]:
+                        stats["total_deleted"] += 1
+                    else:
+                        stats["failed_deletes"] += 1
+                    yield f"  - ID: {doc['doc_id']}"
+                    yield f"    文件名: {doc['name']}"
+                    yield f"    处理进度: {doc['process'] * 100}%"
+                    yield f"    状态: {'成功' if deleted[doc['doc_id']] else '失败'}"
 
     def run(self, doc_ids: list[str], run: int) -> dict:
         """
@@ -679,6 +1191,18 @@ class RAGFlowCli:
             if result['success']:
                 response_data = result['data']
                 if response_data.get('code') == 0:
+                    # 与服务端触发解析时重置的字段保持一致；本地数据库也要同步修改，
+                    # 否则基于缓存的同步看到 update_date 未变化，不会更新数据库中的处理进度
+                    if run == 1:
+                        self.listing_cache.update(doc_ids, run='1', progress=0, progress_msg='', chunk_num=0)
+                        conn = sqlite3.connect(self.db_path)
+                        c = conn.cursor()
+                        c.executemany("UPDATE documents SET process = '0', process_msg = '', chunk_num = 0 "
+                                      "WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+                        conn.commit()
+                        conn.close()
+                    else:
+                        self.listing_cache.update(doc_ids, run=str(run))
                     return {"success": True, "message": "文档解析任务已触发"}
                 else:
                     return {"success": False, "message": f"触发解析失败: {response_data.get('message')}"}
@@ -687,3 +1211,112 @@ class RAGFlowCli:
 
         except Exception as e:
             return {"success": False, "message": f"触发解析时发生错误: {str(e)}"}
+
+    def watch_directory(self, kb_id: str, directory_path: str, interval: float = 10, settle_seconds: float = 30,
+                        batch_size: int = 20, auto_parse: bool = False, full_scan_interval: float = 3600,
+                        max_attempts: int = 5, retry_backoff: float = 60, manifest_interval: float = 600,
+                        stop_event=None):
+        """
+        持续监控目录，自动上传新增或修改过的PDF文件（阻塞运行，直到 stop_event 被设置或按下 Ctrl+C）
+        :param kb_id: 知识库ID
+        :param directory_path: 监控的目录
+        :param interval: 轮询间隔（秒）
+        :param settle_seconds: 文件多久没有变化后视为写入完成（秒）
+        :param batch_size: 每批上传的文件数
+        :param auto_parse: 上传后是否自动触发解析
+        :param full_scan_interval: 全量扫描的间隔（秒），用于发现原地修改的文件
+        :param max_attempts: 网络错误或服务端过载导致上传失败时最多尝试的次数
+        :param retry_backoff: 第一次重试前的等待时间（秒），之后每次翻倍
+        :param manifest_interval: 有新上传时刷新已导出的知识库清单的最小间隔（秒）
+        :param stop_event: threading.Event，用于从其他线程停止监控
+        """
+        if not os.path.exists(directory_path):
+            return {"success": False, "message": "目录不存在"}
+        # 启动时同步一次，之后每批上传后增量同步，保证基于数据库的去重有效
+        self.sync(kb_id)
+        daemon = WatchFolderDaemon(self, kb_id, directory_path, interval=interval, settle_seconds=settle_seconds,
+                                   batch_size=batch_size, auto_parse=auto_parse,
+                                   full_scan_interval=full_scan_interval, max_attempts=max_attempts,
+                                   retry_backoff=retry_backoff, manifest_interval=manifest_interval)
+        daemon.run_forever(stop_event)
+        return {"success": True, "message": "已停止监控"}
+
+    def retrieval_test(self, kb_id: str, question: str, page: int = 1, size: int = 30,
+                       similarity_threshold: float = 0.2, vector_similarity_weight: float = 0.3,
+                       top_k: int = 1024, doc_ids: list[str] = None) -> dict:
+        """
+        检索测试（对应RAGFlow页面上的“检索测试”）
+
+        Args:
+            kb_id: 知识库ID
+            question: 查询内容
+            page: 页码
+            size: 每页返回的分块数
+            similarity_threshold: 相似度阈值
+            vector_similarity_weight: 向量相似度权重
+            top_k: 参与重排的分块数
+            doc_ids: 限定检索的文档ID列表
+
+        Returns:
+            dict: {"success", "message", "chunks", "total"}
+        """
+        try:
+            payload = {
+                "kb_id": kb_id,
+                "question": question,
+                "page": page,
+                "size": size,
+                "similarity_threshold": similarity_threshold,
+                "vector_similarity_weight": vector_similarity_weight,
+                "top_k": top_k
+            }
+            if doc_ids:
+                payload["doc_ids"] = doc_ids
+
+            result = self.__do_request__('POST', self.retrieval_url, json=payload)
+
+            if result and result['success']:
+                data = result['data'].get('data') or {}
+                return {
+                    "success": True,
+                    "message": "检索成功",
+                    "chunks": data.get('chunks', []),
+                    "total": data.get('total', 0)
+                }
+            return {"success": False, "message": f"请求失败: {result.get('error') if result else '请求体太大'}"}
+
+        except Exception as e:
+            return {"success": False, "message": f"检索时发生错误: {str(e)}"}
+
+    def load_test_retrieval(self, kb_id: str, queries, concurrency: int = 4, qps: float = None,
+                            rounds: int = 1, save: bool = True, **retrieval_kwargs) -> dict:
+        """
+        检索压测：回放查询并统计延迟分位数、错误率和返回结果数
+
+        Args:
+            kb_id: 知识库ID
+            queries: 查询列表，或查询文件路径（.jsonl 取 question 字段，其他格式每行一个查询）
+            concurrency: 最大并发请求数
+            qps: 目标QPS，为None时以固定并发尽可能快地发送
+            rounds: 回放轮数
+            save: 是否把结果连同当时的知识库规模保存到 retrieval_runs 表
+            **retrieval_kwargs: 透传给 retrieval_test 的参数
+
+        Returns:
+            dict: 压测统计结果，保存时包含 run_id
+        """
+        if isinstance(queries, str):
+            queries = load_queries(queries)
+        runner = RetrievalLoadRunner(self, kb_id, concurrency=concurrency, qps=qps, **retrieval_kwargs)
+        result = runner.run(queries, rounds=rounds)
+        if save:
+            result["run_id"] = save_run(self.db_path, result)
+        return result
+
+
+def _upload_worker_main(auth_token: str, base_url: str, db_path: str, max_upload_size: int,
+                        kb_id: str, job_id: str, lease_seconds: float, cross_kb: str = None):
+    """upload_directory_parallel 启动的工作进程入口"""
+    cli = RAGFlowCli(auth_token, base_url, db_path=db_path, max_upload_size=max_upload_size)
+    stats = cli.work_upload_queue(kb_id, job_id, lease_seconds=lease_seconds, cross_kb=cross_kb)
+    logging.info(f"工作进程结束：{stats}")
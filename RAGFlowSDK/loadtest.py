@@ -0,0 +1,167 @@
+"""
+知识库检索压测
+
+按目标QPS（开环）或固定并发（闭环）回放查询文件，统计检索延迟的 p50/p95/p99、错误率和返回结果数，
+并与压测时本地数据库中的知识库规模（文档数、分块数）一起记录到 retrieval_runs 表，便于观察延迟随知识库增长的变化。
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+
+def load_queries(path: str) -> List[str]:
+    """
+    读取查询文件
+
+    .jsonl 文件每行一个JSON对象，取其中的 question 字段；其他文件每行一个查询，忽略空行。
+    """
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.lower().endswith(".jsonl"):
+                queries.append(json.loads(line)["question"])
+            else:
+                queries.append(line)
+    return queries
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩法计算百分位数，sorted_values 须已升序排列"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(-(-p * len(sorted_values) // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class RetrievalLoadRunner:
+    """
+    检索压测执行器
+    """
+
+    def __init__(self, cli, kb_id: str, concurrency: int = 4, qps: float = None, **retrieval_kwargs):
+        """
+        Args:
+            cli: RAGFlowCli 实例
+            kb_id: 知识库ID
+            concurrency: 最大并发请求数
+            qps: 目标QPS，为None时以固定并发尽可能快地发送（闭环）
+            **retrieval_kwargs: 透传给 RAGFlowCli.retrieval_test 的参数
+        """
+        self.cli = cli
+        self.kb_id = kb_id
+        self.concurrency = concurrency
+        self.qps = qps
+        self.retrieval_kwargs = retrieval_kwargs
+        self._lock = threading.Lock()
+
+    def _query(self, question: str, scheduled_at: Optional[float], samples: list):
+        # 开环模式从计划发送时间开始计时，排队等待的时间也计入延迟，避免协调遗漏；
+        # 闭环模式的查询是一次性提交到线程池的，排队时间不属于服务端延迟，从真正发出请求时开始计时
+        start = time.monotonic() if scheduled_at is None else scheduled_at
+        result = self.cli.retrieval_test(self.kb_id, question, **self.retrieval_kwargs)
+        latency = time.monotonic() - start
+        with self._lock:
+            samples.append((latency, result["success"], len(result.get("chunks", []))))
+
+    def run(self, queries: List[str], rounds: int = 1) -> dict:
+        """
+        执行压测
+
+        Args:
+            queries: 查询列表
+            rounds: 回放轮数
+
+        Returns:
+            dict: 压测统计结果
+        """
+        samples = []
+        # 压测期间固定检索接口的并发上限，避免自适应并发控制干扰测量
+        limiter = self.cli.concurrency.limiters["retrieval"]
+        bounds = (limiter.min_limit, limiter.max_limit)
+        limiter.set_bounds(self.concurrency, self.concurrency)
+        started_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        start = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                for i, question in enumerate(q for _ in range(rounds) for q in queries):
+                    scheduled_at = None
+                    if self.qps:
+                        scheduled_at = start + i / self.qps
+                        delay = scheduled_at - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                    pool.submit(self._query, question, scheduled_at, samples)
+        finally:
+            limiter.set_bounds(*bounds)
+        elapsed = time.monotonic() - start
+
+        latencies = sorted(latency for latency, success, _ in samples if success)
+        errors = sum(1 for _, success, _ in samples if not success)
+        result_counts = [count for _, success, count in samples if success]
+        total = len(samples)
+        return {
+            "kb_id": self.kb_id,
+            "started_at": started_at,
+            "total": total,
+            "errors": errors,
+            "error_rate": errors / total if total else 0.0,
+            "concurrency": self.concurrency,
+            "target_qps": self.qps,
+            "achieved_qps": total / elapsed if elapsed else 0.0,
+            "elapsed": elapsed,
+            "latency_mean": sum(latencies) / len(latencies) if latencies else None,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "results_mean": sum(result_counts) / len(result_counts) if result_counts else None,
+            "results_zero": sum(1 for count in result_counts if count == 0),
+        }
+
+
+def save_run(db_path: str, result: dict) -> str:
+    """
+    保存压测结果，并记录当时本地数据库中该知识库的文档数、分块数和总大小
+
+    Returns:
+        str: 压测记录ID
+    """
+    run_id = uuid.uuid4().hex
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS retrieval_runs
+                (run_id TEXT PRIMARY KEY,
+                 kb_id TEXT,
+                 started_at TEXT,
+                 doc_count INTEGER,      -- 压测时知识库的文档数
+                 chunk_num INTEGER,      -- 压测时知识库的分块总数
+                 total_size INTEGER,     -- 压测时知识库的文件总大小
+                 total INTEGER,
+                 errors INTEGER,
+                 error_rate REAL,
+                 concurrency INTEGER,
+                 target_qps REAL,
+                 achieved_qps REAL,
+                 latency_mean REAL,
+                 latency_p50 REAL,
+                 latency_p95 REAL,
+                 latency_p99 REAL,
+                 results_mean REAL,
+                 results_zero INTEGER)''')
+    c.execute('SELECT COUNT(*), SUM(chunk_num), SUM(size) FROM documents WHERE kb_id = ?', (result["kb_id"],))
+    doc_count, chunk_num, total_size = c.fetchone()
+    c.execute('''INSERT INTO retrieval_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+              (run_id, result["kb_id"], result["started_at"], doc_count, chunk_num, total_size,
+               result["total"], result["errors"], result["error_rate"], result["concurrency"],
+               result["target_qps"], result["achieved_qps"], result["latency_mean"],
+               result["latency_p50"], result["latency_p95"], result["latency_p99"],
+               result["results_mean"], result["results_zero"]))
+    conn.commit()
+    conn.close()
+    return run_id
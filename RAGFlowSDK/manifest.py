@@ -0,0 +1,195 @@
+"""
+知识库文档清单（manifest）快照
+
+将某个知识库在 documents 表中的 (file_hash → doc_id, status) 集合导出为按哈希值排序的紧凑二进制文件，
+多个进程（甚至多台机器）可以只读地 mmap 同一个文件，通过二分查找完成存在性检查，无需各自打开SQLite连接。
+
+清单不做增量合并：每次刷新都要扫描该知识库在数据库中的全部记录计算指纹，指纹变化时整体重建文件，
+耗时与知识库规模成正比。因此只在一批写入结束后刷新一次，持续运行的监控目录按固定间隔刷新。
+
+文件格式（小端序）:
+    头部: magic(4s) | version(H) | reserved(H) | count(Q) | fingerprint(32s) | kb_id(32s, 右侧补\\0)
+    记录: file_hash(32s, SHA256原始字节) | doc_id(32s, 右侧补\\0) | status(b)
+"""
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+from typing import Optional, Tuple
+
+MAGIC = b"RFMF"
+VERSION = 2
+HEADER = struct.Struct("<4sHHQ32s32s")
+RECORD = struct.Struct("<32s32sb")
+UNKNOWN_STATUS = -128
+
+
+def _encode_status(status) -> int:
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return UNKNOWN_STATUS
+
+
+def kb_fingerprint(conn: sqlite3.Connection, kb_id: str) -> bytes:
+    """
+    计算知识库在本地数据库中的指纹，用于判断清单是否需要重建
+    """
+    # 指纹包含知识库ID，另一个知识库的清单文件即使内容相同也会被重建
+    digest = hashlib.sha256(kb_id.encode("utf-8") + b"\n")
+    c = conn.cursor()
+    c.execute('''SELECT doc_id, file_hash, status, update_date FROM documents
+                 WHERE kb_id = ? AND length(file_hash) = 64 ORDER BY doc_id''', (kb_id,))
+    for row in c:
+        digest.update("|".join(str(v) for v in row).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.digest()
+
+
+def read_fingerprint(path: str) -> Optional[bytes]:
+    """读取清单文件头部中的指纹，文件不存在或格式不对时返回None"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) != HEADER.size:
+        return None
+    magic, version, _, _, fingerprint, _ = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return fingerprint
+
+
+def write_manifest(db_path: str, kb_id: str, path: str, force: bool = False) -> dict:
+    """
+    从documents表导出知识库清单
+
+    计算指纹和重建都要扫描知识库的全部记录，不是增量更新。
+    先写入临时文件再原子替换，已经mmap旧文件的进程不受影响，重新打开即可读取新版本。
+
+    Args:
+        db_path: SQLite数据库路径
+        kb_id: 知识库ID
+        path: 清单文件路径
+        force: 为True时即使指纹未变化也重建
+
+    Returns:
+        dict: {"updated": 是否重写了文件, "count": 记录数, "path": 文件路径}
+    """
+    kb_id_bytes = kb_id.encode("ascii")
+    if len(kb_id_bytes) > 32:
+        raise ValueError(f"知识库ID超过32字节，无法写入清单: {kb_id}")
+    conn = sqlite3.connect(db_path)
+    try:
+        fingerprint = kb_fingerprint(conn, kb_id)
+        if not force and read_fingerprint(path) == fingerprint:
+            with open(path, "rb") as f:
+                count = HEADER.unpack(f.read(HEADER.size))[3]
+            return {"updated": False, "count": count, "path": path}
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        count = 0
+        c = conn.cursor()
+        # SHA256十六进制小写字符串的字典序与其原始字节序一致，可以直接让SQLite排序
+        c.execute('''SELECT file_hash, doc_id, status FROM documents
+                     WHERE kb_id = ? AND length(file_hash) = 64
+                     ORDER BY file_hash, doc_id''', (kb_id,))
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, 0, fingerprint, kb_id_bytes))
+            for file_hash, doc_id, status in c:
+                doc_id_bytes = doc_id.encode("ascii")
+                if len(doc_id_bytes) > 32:
+                    raise ValueError(f"文档ID超过32字节，无法写入清单: {doc_id}")
+                f.write(RECORD.pack(bytes.fromhex(file_hash.lower()), doc_id_bytes, _encode_status(status)))
+                count += 1
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, 0, count, fingerprint, kb_id_bytes))
+        os.replace(temp_path, path)
+        return {"updated": True, "count": count, "path": path}
+    finally:
+        conn.close()
+
+
+class ManifestReader:
+    """
+    只读的清单文件读取器，基于mmap + 二分查找
+    """
+
+    def __init__(self, path: str, kb_id: str = None):
+        """
+        Args:
+            path: 清单文件路径
+            kb_id: 期望的知识库ID，提供时与清单头部记录的知识库ID不一致会抛出ValueError
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"清单文件已损坏: {path}")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        magic, version, _, self.count, self.fingerprint, kb_id_bytes = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"不支持的清单文件格式: {path}")
+        self.kb_id = kb_id_bytes.rstrip(b"\0").decode("ascii")
+        if kb_id is not None and kb_id != self.kb_id:
+            self.close()
+            raise ValueError(f"清单文件属于知识库 {self.kb_id}，不是 {kb_id}: {path}")
+        if HEADER.size + self.count * RECORD.size > size:
+            self.close()
+            raise ValueError(f"清单文件已损坏: {path}")
+
+    def _key_at(self, index: int) -> bytes:
+        offset = HEADER.size + index * RECORD.size
+        return self._mm[offset:offset + 32]
+
+    def lookup(self, file_hash: str) -> Optional[Tuple[str, int]]:
+        """
+        查找文件哈希值对应的文档
+
+        Args:
+            file_hash: SHA256十六进制字符串
+
+        Returns:
+            (doc_id, status)，不存在时返回None；同一哈希对应多个文档时返回doc_id最小的一个
+        """
+        key = bytes.fromhex(file_hash)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo >= self.count or self._key_at(lo) != key:
+            return None
+        _, doc_id, status = RECORD.unpack_from(self._mm, HEADER.size + lo * RECORD.size)
+        return doc_id.rstrip(b"\0").decode("ascii"), status
+
+    def __contains__(self, file_hash: str) -> bool:
+        return self.lookup(file_hash) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
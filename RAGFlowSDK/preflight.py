@@ -0,0 +1,122 @@
+"""
+上传前的本地预检与按大小调度
+
+在发送任何字节之前检查文件大小上限、文件头魔数以及PDF是否被截断，
+避免上传完整个文件后才收到413或解析失败。
+"""
+import os
+from typing import Iterable, List, Optional, Tuple
+
+# RAGFlow 服务端 MAX_CONTENT_LENGTH 的默认值（128MB）
+DEFAULT_MAX_UPLOAD_SIZE = 128 * 1024 * 1024
+
+_OLE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+_ZIP = b"PK\x03\x04"
+
+# 扩展名 → 允许的文件头魔数，空元组表示纯文本类文件不检查魔数
+FILE_SIGNATURES = {
+    ".pdf": (b"%PDF-",),
+    ".docx": (_ZIP,),
+    ".xlsx": (_ZIP,),
+    ".pptx": (_ZIP,),
+    ".doc": (_OLE,),
+    ".xls": (_OLE,),
+    ".ppt": (_OLE,),
+    ".png": (b"\x89PNG\r\n\x1a\n",),
+    ".jpg": (b"\xff\xd8\xff",),
+    ".jpeg": (b"\xff\xd8\xff",),
+    ".txt": (),
+    ".md": (),
+    ".csv": (),
+}
+
+# PDF规范要求 %%EOF 出现在文件最后1024字节内
+_PDF_TAIL_SIZE = 1024
+
+
+def check_file(file_path: str, max_size: int = DEFAULT_MAX_UPLOAD_SIZE,
+               signatures: dict = None) -> Tuple[Optional[str], Optional[int]]:
+    """
+    检查单个文件能否上传
+
+    Args:
+        file_path: 文件路径
+        max_size: 服务端允许的最大文件大小（字节）
+        signatures: 扩展名与魔数的映射，默认为 FILE_SIGNATURES
+
+    Returns:
+        (reason, size): reason 为拒绝原因，可以上传时为None；size 为文件大小，无法获取时为None
+    """
+    signatures = FILE_SIGNATURES if signatures is None else signatures
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in signatures:
+        return f"不支持的文件类型: {ext or '无扩展名'}", None
+    try:
+        size = os.path.getsize(file_path)
+    except OSError as e:
+        return f"无法读取文件: {str(e)}", None
+    if size == 0:
+        return "文件为空（0字节）", size
+    if size > max_size:
+        return f"文件大小 {size:,} 字节超过服务端上限 {max_size:,} 字节", size
+
+    magics = signatures[ext]
+    try:
+        with open(file_path, "rb") as f:
+            if magics:
+                head = f.read(max(len(m) for m in magics))
+                if not any(head.startswith(m) for m in magics):
+                    return f"文件头与扩展名 {ext} 不匹配，文件可能已损坏", size
+            if ext == ".pdf":
+                f.seek(max(0, size - _PDF_TAIL_SIZE))
+                if b"%%EOF" not in f.read():
+                    return "PDF文件缺少 %%EOF 结束标记，文件可能被截断", size
+    except OSError as e:
+        # 扫描之后被删除、没有读权限或网络卷读取失败
+        return f"无法读取文件: {str(e)}", size
+    return None, size
+
+
+def preflight(file_paths: Iterable[str], max_size: int = DEFAULT_MAX_UPLOAD_SIZE,
+              signatures: dict = None) -> Tuple[List[Tuple[str, int]], List[dict]]:
+    """
+    批量预检文件
+
+    Returns:
+        (accepted, rejected): accepted 为 [(文件路径, 文件大小)]，
+        rejected 为 [{"file": 文件路径, "error": 拒绝原因}]，格式与上传报告中的 failed_files 一致
+    """
+    accepted = []
+    rejected = []
+    for file_path in file_paths:
+        reason, size = check_file(file_path, max_size, signatures)
+        if reason is None:
+            accepted.append((file_path, size))
+        else:
+            rejected.append({"file": file_path, "error": f"预检未通过: {reason}"})
+    return accepted, rejected
+
+
+def schedule_by_size(files: List[Tuple[str, int]]) -> List[str]:
+    """
+    按大小交错排列上传顺序：最小、最大、次小、次大……
+
+    大文件穿插在小文件之间，既不会让一批大文件长时间堵住队列，
+    也能让多个并发上传通道之间的负载更均衡。
+
+    Args:
+        files: [(文件路径, 文件大小)]
+
+    Returns:
+        list: 排好序的文件路径
+    """
+    ordered = sorted(files, key=lambda x: x[1])
+    schedule = []
+    lo, hi = 0, len(ordered) - 1
+    while lo <= hi:
+        schedule.append(ordered[lo][0])
+        if lo != hi:
+            schedule.append(ordered[hi][0])
+        lo += 1
+        hi -= 1
+    return schedule
@@ -0,0 +1,329 @@
+"""
+监控目录的持续上传守护进程
+
+轮询扫描目录，发现新增或修改过的PDF文件后等待其写入完成（大小和修改时间在一段时间内不再变化），
+再按批上传到知识库，可选地自动触发解析。
+
+扫描状态全部保存在SQLite中，进程内存不随运行时间或目录规模增长：
+    - 只有修改时间发生变化的目录才会重新列出其中的文件，其余目录只需一次stat
+    - 原地修改已有文件不会改变目录的修改时间，由周期性的全量扫描兜底
+    - 网络错误或服务端过载导致的失败按指数退避重试，超过次数上限后才记为失败
+    - 每批上传后只拉取最新的文档列表页，不做全量同步；已导出的知识库清单按固定间隔刷新，而不是每批刷新
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class WatchFolderDaemon:
+    """
+    监控目录并持续上传新文件
+    """
+
+    def __init__(self, cli, kb_id: str, directory_path: str, interval: float = 10, settle_seconds: float = 30,
+                 batch_size: int = 20, auto_parse: bool = False, full_scan_interval: float = 3600,
+                 extensions: tuple = ('.pdf',), max_attempts: int = 5, retry_backoff: float = 60,
+                 manifest_interval: float = 600):
+        """
+        Args:
+            cli: RAGFlowCli 实例
+            kb_id: 知识库ID
+            directory_path: 监控的目录
+            interval: 轮询间隔（秒）
+            settle_seconds: 文件大小和修改时间保持不变多久后视为写入完成（秒）
+            batch_size: 每批上传的文件数
+            auto_parse: 上传后是否自动触发解析
+            full_scan_interval: 全量扫描的间隔（秒），用于发现原地修改的文件
+            extensions: 需要上传的文件扩展名
+            max_attempts: 可重试的失败（网络错误、429/5xx）最多尝试上传的次数
+            retry_backoff: 第一次重试前的等待时间（秒），之后每次翻倍
+            manifest_interval: 有新上传时刷新已导出的知识库清单的最小间隔（秒），清单刷新的耗时与知识库规模成正比
+        """
+        self.cli = cli
+        self.kb_id = kb_id
+        self.root = os.path.abspath(directory_path)
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.batch_size = batch_size
+        self.auto_parse = auto_parse
+        self.full_scan_interval = full_scan_interval
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.manifest_interval = manifest_interval
+        self._last_full_scan = 0.0
+        self._last_manifest_refresh = time.monotonic()
+        self._manifest_dirty = False
+        self._init_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.cli.db_path, timeout=60)
+
+    def _init_tables(self):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS watch_dirs
+                    (root TEXT,
+                     path TEXT,
+                     parent TEXT,
+                     mtime_ns INTEGER,
+                     PRIMARY KEY (root, path))''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_watch_dirs_parent ON watch_dirs (root, parent)')
+        c.execute('''CREATE TABLE IF NOT EXISTS watch_files
+                    (root TEXT,
+                     path TEXT,
+                     parent TEXT,
+                     size INTEGER,
+                     mtime_ns INTEGER,
+                     state TEXT,            -- pending / done / failed
+                     changed_at REAL,       -- 最近一次观察到大小或修改时间变化的时间，重试时推迟到退避结束
+                     message TEXT,
+                     attempts INTEGER DEFAULT 0,
+                     PRIMARY KEY (root, path))''')
+        c.execute('PRAGMA table_info(watch_files)')
+        if 'attempts' not in {row[1] for row in c.fetchall()}:
+            c.execute('ALTER TABLE watch_files ADD COLUMN attempts INTEGER DEFAULT 0')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_watch_files_state ON watch_files (root, state, changed_at)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_watch_files_parent ON watch_files (root, parent)')
+        conn.commit()
+        conn.close()
+
+    def _record_file(self, c, path: str, parent: str, size: int, mtime_ns: int, now: float):
+        """登记扫描到的文件，新文件或大小/修改时间变化的文件置为待上传"""
+        c.execute('SELECT size, mtime_ns FROM watch_files WHERE root = ? AND path = ?', (self.root, path))
+        row = c.fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            c.execute('''INSERT OR REPLACE INTO watch_files
+                         (root, path, parent, size, mtime_ns, state, changed_at, message, attempts)
+                         VALUES (?, ?, ?, ?, ?, 'pending', ?, NULL, 0)''', (self.root, path, parent, size, mtime_ns, now))
+
+    def _forget_dir(self, c, path: str):
+        """目录被删除后清理它及其子目录的记录"""
+        prefix = path.rstrip(os.sep) + os.sep
+        c.execute('DELETE FROM watch_dirs WHERE root = ? AND (path = ? OR substr(path, 1, ?) = ?)',
+                  (self.root, path, len(prefix), prefix))
+        c.execute('DELETE FROM watch_files WHERE root = ? AND substr(path, 1, ?) = ?',
+                  (self.root, len(prefix), prefix))
+
+    def _scan_dir(self, c, path: str, parent: str, full: bool, now: float):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._forget_dir(c, path)
+            return
+        c.execute('SELECT mtime_ns FROM watch_dirs WHERE root = ? AND path = ?', (self.root, path))
+        row = c.fetchone()
+
+        if not full and row is not None and row[0] == mtime_ns:
+            # 目录内容没有变化，只需继续检查已知的子目录
+            c.execute('SELECT path FROM watch_dirs WHERE root = ? AND parent = ?', (self.root, path))
+            for (child,) in c.fetchall():
+                self._scan_dir(c, child, path, full, now)
+            return
+
+        subdirs = []
+        files = set()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file() and entry.name.lower().endswith(self.extensions):
+                        st = entry.stat()
+                        files.add(entry.path)
+                        self._record_file(c, entry.path, path, st.st_size, st.st_mtime_ns, now)
+                except FileNotFoundError:
+                    continue
+        # 清理已经不存在的文件和子目录
+        c.execute('SELECT path FROM watch_files WHERE root = ? AND parent = ?', (self.root, path))
+        for (child,) in c.fetchall():
+            if child not in files:
+                c.execute('DELETE FROM watch_files WHERE root = ? AND path = ?', (self.root, child))
+        existing = set(subdirs)
+        c.execute('SELECT path FROM watch_dirs WHERE root = ? AND parent = ?', (self.root, path))
+        for (child,) in c.fetchall():
+            if child not in existing:
+                self._forget_dir(c, child)
+        c.connection.commit()
+        # 先处理子目录再记录本目录的修改时间，扫描中途退出时下次会重新列出本目录
+        for child in subdirs:
+            self._scan_dir(c, child, path, full, now)
+        c.execute('INSERT OR REPLACE INTO watch_dirs (root, path, parent, mtime_ns) VALUES (?, ?, ?, ?)',
+                  (self.root, path, parent, mtime_ns))
+        c.connection.commit()
+
+    def scan(self):
+        """扫描目录，登记新增或修改过的文件"""
+        now = time.time()
+        full = now - self._last_full_scan >= self.full_scan_interval
+        conn = self._connect()
+        c = conn.cursor()
+        self._scan_dir(c, self.root, None, full, now)
+        conn.commit()
+        conn.close()
+        if full:
+            self._last_full_scan = now
+
+    def _settle(self) -> list:
+        """
+        检查待上传文件是否已写入完成
+
+        Returns:
+            list: 本批可以上传的文件路径，最多 batch_size 个
+        """
+        now = time.time()
+        ready = []
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''SELECT path, size, mtime_ns, changed_at FROM watch_files
+                     WHERE root = ? AND state = 'pending' ORDER BY changed_at''', (self.root,))
+        rows = c.fetchmany(self.batch_size * 4)
+        for path, size, mtime_ns, changed_at in rows:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                c.execute('DELETE FROM watch_files WHERE root = ? AND path = ?', (self.root, path))
+                continue
+            if st.st_size != size or st.st_mtime_ns != mtime_ns:
+                # 仍在写入中，重新计时
+                c.execute('UPDATE watch_files SET size = ?, mtime_ns = ?, changed_at = ? WHERE root = ? AND path = ?',
+                          (st.st_size, st.st_mtime_ns, now, self.root, path))
+            elif now - changed_at >= self.settle_seconds:
+                ready.append(path)
+                if len(ready) >= self.batch_size:
+                    break
+        conn.commit()
+        conn.close()
+        return ready
+
+    def _mark(self, path: str, state: str, message: str):
+        conn = self._connect()
+        conn.execute('UPDATE watch_files SET state = ?, message = ? WHERE root = ? AND path = ?',
+                     (state, message, self.root, path))
+        conn.commit()
+        conn.close()
+
+    def _retry_later(self, path: str, message: str) -> bool:
+        """
+        可重试的失败：推迟 changed_at 实现指数退避，超过次数上限后记为失败
+
+        Returns:
+            bool: 是否会再次重试
+        """
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('SELECT attempts FROM watch_files WHERE root = ? AND path = ?', (self.root, path))
+        row = c.fetchone()
+        attempts = (row[0] or 0) + 1 if row else 1
+        retry = attempts < self.max_attempts
+        if retry:
+            delay = self.retry_backoff * 2 ** (attempts - 1)
+            c.execute('''UPDATE watch_files SET attempts = ?, message = ?, changed_at = ?
+                         WHERE root = ? AND path = ?''', (attempts, message, time.time() + delay, self.root, path))
+        else:
+            c.execute('''UPDATE watch_files SET attempts = ?, message = ?, state = 'failed'
+                         WHERE root = ? AND path = ?''', (attempts, message, self.root, path))
+        conn.commit()
+        conn.close()
+        return retry
+
+    def upload_batch(self, paths: list) -> dict:
+        """
+        上传一批文件，上传成功后增量同步一次知识库，按需触发解析
+
+        Returns:
+            dict: {"success": 成功数, "failed": 失败数, "retrying": 稍后重试数, "parsed": 触发解析的文档数}
+        """
+        stats = {"success": 0, "failed": 0, "retrying": 0, "parsed": 0}
+        uploaded_hashes = []
+        for path in paths:
+            file_hash = None
+            try:
+                file_hash = self.cli._calculate_file_hash(path)
+            except OSError:
+                pass
+            if file_hash is not None and file_hash in uploaded_hashes:
+                stats["failed"] += 1
+                self._mark(path, 'failed', "相同内容的文件已在本批中上传，跳过上传")
+                continue
+            # upload_file 内部会基于本地数据库的哈希值去重
+            result = self.cli.upload_file(self.kb_id, path, file_hash=file_hash, sync_after=False)
+            if result["success"]:
+                stats["success"] += 1
+                uploaded_hashes.append(file_hash)
+                self._mark(path, 'done', result["message"])
+                logging.info(f"已上传: {path}")
+            elif result.get("retryable") and self._retry_later(path, result["message"]):
+                stats["retrying"] += 1
+                logging.warning(f"上传失败，稍后重试: {path} {result['message']}")
+            else:
+                # 预检未通过、已存在等确定性的失败不再重试，文件被修改后会重新上传
+                stats["failed"] += 1
+                if not result.get("retryable"):
+                    self._mark(path, 'failed', result["message"])
+                logging.warning(f"上传失败: {path} {result['message']}")
+
+        if uploaded_hashes:
+            # 每批只拉取一次最新的文档列表页，让后续批次能基于数据库去重；清单在 run_once 中按间隔刷新
+            self.cli.sync_recent(self.kb_id, refresh_manifest=False)
+            self._manifest_dirty = True
+            if self.auto_parse:
+                conn = self._connect()
+                c = conn.cursor()
+                placeholders = ",".join("?" * len(uploaded_hashes))
+                c.execute(f'SELECT doc_id FROM documents WHERE kb_id = ? AND file_hash IN ({placeholders})',
+                          (self.kb_id, *uploaded_hashes))
+                doc_ids = [row[0] for row in c.fetchall()]
+                conn.close()
+                if doc_ids:
+                    result = self.cli.run(doc_ids, 1)
+                    if result["success"]:
+                        stats["parsed"] = len(doc_ids)
+                    else:
+                        logging.error(result["message"])
+        return stats
+
+    def run_once(self) -> dict:
+        """执行一轮：扫描、等待写入完成、按批上传"""
+        self.scan()
+        totals = {"success": 0, "failed": 0, "retrying": 0, "parsed": 0}
+        while True:
+            batch = self._settle()
+            if not batch:
+                break
+            stats = self.upload_batch(batch)
+            for key in totals:
+                totals[key] += stats[key]
+        self._refresh_manifest()
+        return totals
+
+    def _refresh_manifest(self):
+        """有新上传且距上次刷新超过 manifest_interval 时刷新已导出的知识库清单"""
+        now = time.monotonic()
+        if self._manifest_dirty and now - self._last_manifest_refresh >= self.manifest_interval:
+            self.cli.refresh_manifest(self.kb_id)
+            self._manifest_dirty = False
+            self._last_manifest_refresh = now
+
+    def run_forever(self, stop_event: threading.Event = None):
+        """
+        持续运行直到 stop_event 被设置或收到 KeyboardInterrupt
+        """
+        stop_event = stop_event or threading.Event()
+        logging.info(f"开始监控目录: {self.root}")
+        try:
+            while not stop_event.is_set():
+                try:
+                    stats = self.run_once()
+                    if stats["success"] or stats["failed"] or stats["retrying"]:
+                        logging.info(f"本轮上传完成：成功 {stats['success']}，失败 {stats['failed']}，"
+                                     f"稍后重试 {stats['retrying']}，触发解析 {stats['parsed']}")
+                except Exception as e:
+                    # 守护进程不因单轮出错退出，下一轮重试
+                    logging.error(f"监控目录时发生错误: {str(e)}", exc_info=True)
+                stop_event.wait(self.interval)
+        except KeyboardInterrupt:
+            pass
+        logging.info(f"停止监控目录: {self.root}")
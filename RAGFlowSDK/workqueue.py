@@ -0,0 +1,316 @@
+"""
+基于租约的SQLite上传任务队列
+
+多个 RAGFlowCli 进程（同一台机器，或通过网络卷共享同一个数据库的多台机器）协同完成同一个目录的上传：
+    - 领取任务时写入租约到期时间，处理期间由心跳线程续约
+    - 进程崩溃后租约过期，任务会被其他进程重新领取
+    - 按内容哈希登记上传权，同一任务中相同内容的文件只会上传一次
+    - 发送上传请求前记录“上传中”，崩溃后重新领取时先核对服务端，避免重复上传
+
+注意：多台机器共享数据库时，各机器上的文件路径必须一致（例如挂载到相同的目录）。
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Iterable, Optional
+
+# 租约过期后允许被重新领取的次数，超过后记为失败，避免“毒文件”反复拖垮进程
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def new_owner_id() -> str:
+    """生成工作进程标识：主机名:进程号:随机串"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class UploadQueue:
+    """
+    上传任务队列，所有状态都保存在SQLite中，不依赖进程内存
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 300, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 busy_timeout: float = 60):
+        """
+        Args:
+            db_path: SQLite数据库路径
+            lease_seconds: 租约时长（秒），心跳间隔为其三分之一
+            max_attempts: 单个文件最多被领取的次数
+            busy_timeout: 等待数据库锁的超时时间（秒）
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.busy_timeout = busy_timeout
+        self._init_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        # 手动管理事务，领取任务时使用 BEGIN IMMEDIATE 抢占写锁
+        return sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+
+    def _init_tables(self):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS upload_queue
+                    (job_id TEXT,
+                     file_path TEXT,
+                     kb_id TEXT,
+                     size INTEGER,
+                     state TEXT,            -- pending / leased / success / failed
+                     owner TEXT,            -- 持有租约的工作进程
+                     lease_expires REAL,    -- 租约到期时间（pending状态下表示最早可领取时间）
+                     attempts INTEGER DEFAULT 0,
+                     file_hash TEXT,
+                     message TEXT,
+                     PRIMARY KEY (job_id, file_path))''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_upload_queue_claim
+                     ON upload_queue (job_id, state, lease_expires)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS upload_hash_claims
+                    (job_id TEXT,
+                     file_hash TEXT,
+                     file_path TEXT,       -- 取得上传权的文件
+                     state TEXT,           -- claimed / uploading / done
+                     PRIMARY KEY (job_id, file_hash))''')
+        conn.close()
+
+    def enqueue(self, job_id: str, kb_id: str, file_paths: Iterable[str], retry_failed: bool = False) -> int:
+        """
+        登记待上传文件，重复登记同一文件不会产生重复任务，因此多个进程/机器可以同时调用
+
+        Args:
+            job_id: 任务ID
+            kb_id: 知识库ID
+            file_paths: 文件路径，领取顺序与登记顺序一致
+            retry_failed: 是否把之前失败的文件重新置为待上传
+
+        Returns:
+            int: 新登记的文件数
+        """
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        added = 0
+        for file_path in file_paths:
+            try:
+                size = os.path.getsize(file_path)
+            except OSError as e:
+                # 预检之后文件被删除或无法访问，记为失败，不影响其他文件
+                c.execute('''INSERT OR IGNORE INTO upload_queue (job_id, file_path, kb_id, state, attempts, message)
+                             VALUES (?, ?, ?, 'failed', 0, ?)''', (job_id, file_path, kb_id, f"读取文件失败: {str(e)}"))
+                added += c.rowcount
+                continue
+            c.execute('''INSERT OR IGNORE INTO upload_queue (job_id, file_path, kb_id, size, state, attempts)
+                         VALUES (?, ?, ?, ?, 'pending', 0)''',
+                      (job_id, file_path, kb_id, size))
+            added += c.rowcount
+        if retry_failed:
+            c.execute('''UPDATE upload_queue SET state = 'pending', owner = NULL, lease_expires = NULL,
+                                attempts = 0, message = NULL
+                         WHERE job_id = ? AND state = 'failed' ''', (job_id,))
+        c.execute('COMMIT')
+        conn.close()
+        return added
+
+    def claim(self, job_id: str, owner: str) -> Optional[str]:
+        """
+        领取一个待上传文件（包括租约已过期的文件）
+
+        Returns:
+            str: 文件路径，当前没有可领取的文件时返回None
+        """
+        conn = self._connect()
+        c = conn.cursor()
+        try:
+            while True:
+                now = time.time()
+                c.execute('BEGIN IMMEDIATE')
+                c.execute('''SELECT file_path, state, attempts FROM upload_queue
+                             WHERE job_id = ? AND state IN ('pending', 'leased')
+                               AND (lease_expires IS NULL OR lease_expires < ?)
+                             ORDER BY rowid LIMIT 1''', (job_id, now))
+                row = c.fetchone()
+                if row is None:
+                    c.execute('COMMIT')
+                    return None
+                file_path, state, attempts = row
+                if state == 'leased' and attempts >= self.max_attempts:
+                    c.execute('''UPDATE upload_queue SET state = 'failed', owner = NULL,
+                                        message = '租约多次过期，处理该文件的进程可能反复崩溃'
+                                 WHERE job_id = ? AND file_path = ?''', (job_id, file_path))
+                    c.execute('COMMIT')
+                    continue
+                c.execute('''UPDATE upload_queue SET state = 'leased', owner = ?, lease_expires = ?,
+                                    attempts = attempts + 1
+                             WHERE job_id = ? AND file_path = ?''',
+                          (owner, now + self.lease_seconds, job_id, file_path))
+                c.execute('COMMIT')
+                return file_path
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id: str, owner: str) -> int:
+        """为工作进程持有的所有租约续期，返回续期的任务数"""
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''UPDATE upload_queue SET lease_expires = ?
+                     WHERE job_id = ? AND owner = ? AND state = 'leased' ''',
+                  (time.time() + self.lease_seconds, job_id, owner))
+        count = c.rowcount
+        conn.close()
+        return count
+
+    def claim_hash(self, job_id: str, file_hash: str, file_path: str) -> str:
+        """
+        登记文件内容的上传权，保证同一任务中相同内容只上传一次
+
+        Returns:
+            str: "owned" 取得上传权；"verify" 取得上传权，但之前的持有者发出上传请求后没有记录结果，
+                 需要先核对服务端是否已经收到；"busy" 相同内容的其他文件正在上传；
+                 "done" 相同内容的其他文件已上传成功；"uploaded" 该文件自身已上传成功
+        """
+        conn = self._connect()
+        c = conn.cursor()
+        try:
+            c.execute('BEGIN IMMEDIATE')
+            c.execute('SELECT file_path, state FROM upload_hash_claims WHERE job_id = ? AND file_hash = ?',
+                      (job_id, file_hash))
+            row = c.fetchone()
+            if row is None:
+                c.execute('''INSERT INTO upload_hash_claims (job_id, file_hash, file_path, state)
+                             VALUES (?, ?, ?, 'claimed')''', (job_id, file_hash, file_path))
+                c.execute('COMMIT')
+                return "owned"
+            claimed_path, state = row
+            if state == 'done':
+                c.execute('COMMIT')
+                # 上传成功后、记录结果前崩溃的情况，文件本身已经上传过
+                return "uploaded" if claimed_path == file_path else "done"
+            # 自己崩溃前登记过的上传权，租约过期后重新领取时继续持有
+            if claimed_path == file_path:
+                c.execute('COMMIT')
+                return "verify" if state == 'uploading' else "owned"
+            # 持有上传权的文件已经彻底失败（例如租约多次过期），由当前文件接管
+            c.execute('''SELECT 1 FROM upload_queue
+                         WHERE job_id = ? AND file_path = ? AND state IN ('pending', 'leased')''',
+                      (job_id, claimed_path))
+            if c.fetchone() is None:
+                c.execute('UPDATE upload_hash_claims SET file_path = ? WHERE job_id = ? AND file_hash = ?',
+                          (file_path, job_id, file_hash))
+                c.execute('COMMIT')
+                return "verify" if state == 'uploading' else "owned"
+            c.execute('COMMIT')
+            return "busy"
+        finally:
+            conn.close()
+
+    def mark_uploading(self, job_id: str, file_hash: str):
+        """发送上传请求前调用，之后崩溃时重新领取该文件的进程会先核对服务端"""
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("UPDATE upload_hash_claims SET state = 'uploading' WHERE job_id = ? AND file_hash = ?",
+                  (job_id, file_hash))
+        conn.close()
+
+    def release_hash(self, job_id: str, file_hash: str, done: bool):
+        """上传成功后标记内容已完成，失败时释放上传权以便相同内容的其他文件重试"""
+        conn = self._connect()
+        c = conn.cursor()
+        if done:
+            c.execute("UPDATE upload_hash_claims SET state = 'done' WHERE job_id = ? AND file_hash = ?",
+                      (job_id, file_hash))
+        else:
+            c.execute('DELETE FROM upload_hash_claims WHERE job_id = ? AND file_hash = ?', (job_id, file_hash))
+        conn.close()
+
+    def defer(self, job_id: str, file_path: str, owner: str, delay: float):
+        """放回队列，delay秒后才能再次被领取（不计入领取次数）"""
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''UPDATE upload_queue SET state = 'pending', owner = NULL, lease_expires = ?,
+                            attempts = attempts - 1
+                     WHERE job_id = ? AND file_path = ? AND owner = ?''',
+                  (time.time() + delay, job_id, file_path, owner))
+        conn.close()
+
+    def complete(self, job_id: str, file_path: str, owner: str, success: bool, message: str = None,
+                 file_hash: str = None) -> bool:
+        """
+        记录任务结果，租约已被其他进程接管时不覆盖
+
+        Returns:
+            bool: 是否成功写入
+        """
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''UPDATE upload_queue SET state = ?, message = ?, file_hash = ?, lease_expires = NULL
+                     WHERE job_id = ? AND file_path = ? AND owner = ? AND state = 'leased' ''',
+                  ('success' if success else 'failed', message, file_hash, job_id, file_path, owner))
+        updated = c.rowcount == 1
+        conn.close()
+        return updated
+
+    def remaining(self, job_id: str) -> int:
+        """尚未完成（待领取或处理中）的任务数"""
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM upload_queue WHERE job_id = ? AND state IN ('pending', 'leased')",
+                  (job_id,))
+        count = c.fetchone()[0]
+        conn.close()
+        return count
+
+    def stats(self, job_id: str) -> dict:
+        """
+        汇总任务结果，格式与 upload_directory 的统计结果一致
+        """
+        conn = self._connect()
+        c = conn.cursor()
+        stats = {
+            "total": 0,
+            "success": 0,
+            "failed": 0,
+            "failed_files": []
+        }
+        c.execute('SELECT state, COUNT(*) FROM upload_queue WHERE job_id = ? GROUP BY state', (job_id,))
+        for state, count in c.fetchall():
+            stats["total"] += count
+            if state in stats:
+                stats[state] += count
+        c.execute("SELECT file_path, message FROM upload_queue WHERE job_id = ? AND state = 'failed' ORDER BY rowid",
+                  (job_id,))
+        for file_path, message in c:
+            stats["failed_files"].append({"file": file_path, "error": message})
+        conn.close()
+        return stats
+
+
+class Heartbeat:
+    """
+    后台续约线程
+    """
+
+    def __init__(self, queue: UploadQueue, job_id: str, owner: str):
+        self.queue = queue
+        self.job_id = job_id
+        self.owner = owner
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"Heartbeat-{owner}", daemon=True)
+
+    def _run(self):
+        interval = self.queue.lease_seconds / 3
+        while not self._stop.wait(interval):
+            try:
+                self.queue.heartbeat(self.job_id, self.owner)
+            except sqlite3.Error as e:
+                logging.warning(f"租约续期失败，将在下一次心跳重试: {str(e)}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
@@ -7,14 +7,10 @@ def main():
     kb_id = "30bfd724c13911efa0ed0242ac120006"
     
     print("开始清理重复文档...")
-    report = cli.clean_duplicates(kb_id)
-    
-    # 将报告同时保存到文件
-    with open('cleanup_report.txt', 'w', encoding='utf-8') as f:
-        f.write(report)
-    
+    # 清理详情边清理边写入文件，只返回汇总
+    report = cli.clean_duplicates(kb_id, report_path='cleanup_report.txt')
+
     print(report)
-    print("\n报告已保存到 cleanup_report.txt")
 
 
 if __name__ == "__main__":
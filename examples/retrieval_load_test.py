@@ -0,0 +1,29 @@
+"""
+检索压测：按目标QPS回放查询文件，结果保存到本地数据库的 retrieval_runs 表
+
+在CI中可以先启动 examples/retrieval_standin_server.py，再把 RAGFLOW_BASE_URL 指向它
+"""
+import sys
+
+from RAGFlowSDK.core import RAGFlowCli
+
+
+def main():
+    cli = RAGFlowCli()
+    kb_id = "f1ee42ceef7811ef9c2c0242ac170006"
+    # 查询文件：每行一个查询，或 .jsonl 每行 {"question": "..."}
+    query_file = sys.argv[1] if len(sys.argv) > 1 else "queries.txt"
+
+    # 先同步知识库，保证记录的文档数和分块数是最新的
+    cli.sync(kb_id)
+    result = cli.load_test_retrieval(kb_id, query_file, concurrency=8, qps=20, rounds=3)
+    print(f"请求数: {result['total']}  错误率: {result['error_rate'] * 100:.2f}%  实际QPS: {result['achieved_qps']:.2f}")
+    if result["latency_p50"] is not None:
+        print(f"延迟 p50: {result['latency_p50'] * 1000:.1f}ms  "
+              f"p95: {result['latency_p95'] * 1000:.1f}ms  "
+              f"p99: {result['latency_p99'] * 1000:.1f}ms")
+    print(f"平均返回分块数: {result['results_mean']}  压测记录ID: {result['run_id']}")
+
+
+if __name__ == "__main__":
+    main()
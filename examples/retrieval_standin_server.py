@@ -0,0 +1,62 @@
+"""
+检索接口的本地替身服务，用于在CI中不依赖真实RAGFlow跑通检索压测
+
+python examples/retrieval_standin_server.py --port 9380 --latency 0.02
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    latency = 0.02
+    chunks = 5
+
+    def _send_json(self, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/v1/document/list"):
+            self._send_json({"code": 0, "data": {"docs": [], "total": 0}, "message": "success"})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.startswith("/v1/chunk/retrieval_test"):
+            # 延迟在设定值附近随机波动
+            time.sleep(random.uniform(0.5, 1.5) * self.latency)
+            chunks = [{"chunk_id": f"chunk-{i}", "content_with_weight": request.get("question", ""),
+                       "similarity": 1.0 - i * 0.1} for i in range(self.chunks)]
+            self._send_json({"code": 0, "data": {"chunks": chunks, "doc_aggs": [], "total": len(chunks)},
+                             "message": "success"})
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9380)
+    parser.add_argument("--latency", type=float, default=0.02, help="平均检索延迟（秒）")
+    parser.add_argument("--chunks", type=int, default=5, help="每次检索返回的分块数")
+    args = parser.parse_args()
+    StandInHandler.latency = args.latency
+    StandInHandler.chunks = args.chunks
+    print(f"检索替身服务已启动: http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), StandInHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
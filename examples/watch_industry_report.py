@@ -0,0 +1,19 @@
+"""
+持续监控投放目录，新文件写入完成后自动上传并触发解析
+"""
+from RAGFlowSDK.core import RAGFlowCli
+
+
+def main():
+    uploader = RAGFlowCli()
+    # 设置要监控的目录路径
+    directory_path = r"E:\data\产业研报-解压过的"
+    kb_id = "f1ee42ceef7811ef9c2c0242ac170006"
+
+    # 阻塞运行，按 Ctrl+C 停止
+    result = uploader.watch_directory(kb_id, directory_path, interval=30, settle_seconds=60, auto_parse=True)
+    print(result["message"])
+
+
+if __name__ == "__main__":
+    main()
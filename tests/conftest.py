@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+from email.parser import BytesParser
+from email.policy import default
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from RAGFlowSDK import core, logger  # noqa: E402
+
+
+@pytest.fixture
+def make_cli(tmp_path, monkeypatch):
+    """创建使用临时目录的客户端，不写系统日志目录和用户配置目录"""
+    monkeypatch.setattr(logger, "init", lambda *args, **kwargs: None)
+    monkeypatch.setattr(core, "APP_CONFIG_DIR", str(tmp_path))
+    monkeypatch.setattr(core, "MANIFEST_DIR", str(tmp_path / "manifests"))
+
+    def factory(base_url: str = "http://127.0.0.1:9", **kwargs):
+        return core.RAGFlowCli("test-token", base_url, db_path=str(tmp_path / "documents.db"), **kwargs)
+
+    return factory
+
+
+def make_pdf(directory, name: str, text: str) -> str:
+    """在目录下写入一个能通过预检的最小PDF文件"""
+    path = directory / name
+    path.write_bytes(b"%PDF-1.4\n" + text.encode("utf-8") + b"\n%%EOF\n")
+    return str(path)
+
+
+def pdf_hash(text: str) -> str:
+    return hashlib.sha256(b"%PDF-1.4\n" + text.encode("utf-8") + b"\n%%EOF\n").hexdigest()
+
+
+def insert_documents(db_path: str, rows):
+    """向documents表写入 (doc_id, kb_id, name, file_hash, status, process) 记录"""
+    conn = sqlite3.connect(db_path)
+    conn.executemany('''INSERT INTO documents (doc_id, kb_id, name, file_hash, status, process, size, update_date)
+                        VALUES (?, ?, ?, ?, ?, ?, 0, '2025-01-01')''', rows)
+    conn.commit()
+    conn.close()
+
+
+class FakeRAGFlow:
+    """
+    内存中的RAGFlow文档接口替身：列表（按创建时间倒序分页）、上传、下载、删除、触发解析
+    """
+
+    def __init__(self):
+        self.docs = {}  # doc_id -> (doc, 文件内容)
+        self.lock = threading.Lock()
+        self.requests = []  # (method, path)
+        self.upload_failures = 0  # 接下来多少次上传返回503
+        self._seq = 0
+
+    def add(self, kb_id: str, name: str, content: bytes) -> dict:
+        with self.lock:
+            self._seq += 1
+            doc = {"id": f"doc{self._seq:04d}", "kb_id": kb_id, "name": name, "size": len(content),
+                   "create_time": self._seq, "create_date": f"2025-01-01 00:00:{self._seq:02d}",
+                   "update_date": f"2025-01-01 00:00:{self._seq:02d}", "status": "1", "run": "0",
+                   "progress": 0, "progress_msg": "", "chunk_num": 0, "source_type": "local"}
+            self.docs[doc["id"]] = (doc, content)
+            return dict(doc)
+
+    def count(self, method: str, prefix: str) -> int:
+        return sum(1 for m, path in self.requests if m == method and path.startswith(prefix))
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    app = None
+
+    def _send(self, body: bytes, content_type: str = "application/json", status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload: dict):
+        self._send(json.dumps(payload).encode("utf-8"))
+
+    def do_GET(self):
+        app = self.app
+        url = urlparse(self.path)
+        app.requests.append(("GET", url.path))
+        if url.path == "/v1/document/list":
+            query = parse_qs(url.query)
+            kb_id = query["kb_id"][0]
+            page = int(query.get("page", ["1"])[0])
+            page_size = int(query.get("page_size", ["15"])[0])
+            with app.lock:
+                docs = sorted((doc for doc, _ in app.docs.values() if doc["kb_id"] == kb_id),
+                              key=lambda doc: doc["create_time"], reverse=True)
+            docs = docs[(page - 1) * page_size:page * page_size]
+            self._send_json({"code": 0, "data": {"docs": docs, "total": len(app.docs)}, "message": "success"})
+        elif url.path.startswith("/v1/document/get/"):
+            doc_id = url.path.rsplit("/", 1)[1]
+            with app.lock:
+                entry = app.docs.get(doc_id)
+            if entry is None:
+                self._send(b"not found", "text/plain", 404)
+            else:
+                self._send(entry[1], "application/pdf")
+        else:
+            self._send(b"not found", "text/plain", 404)
+
+    def do_POST(self):
+        app = self.app
+        path = urlparse(self.path).path
+        app.requests.append(("POST", path))
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if path == "/v1/document/upload":
+            with app.lock:
+                fail = app.upload_failures > 0
+                app.upload_failures -= fail
+            if fail:
+                self._send(b"busy", "text/plain", 503)
+                return
+            message = BytesParser(policy=default).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("ascii") + body)
+            fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+            kb_id = fields["kb_id"].get_content().strip()
+            file_part = fields["file"]
+            doc = app.add(kb_id, file_part.get_filename(), file_part.get_payload(decode=True))
+            self._send_json({"code": 0, "data": [doc], "message": "success"})
+        elif path == "/v1/document/rm":
+            with app.lock:
+                for doc_id in json.loads(body)["doc_id"]:
+                    app.docs.pop(doc_id, None)
+            self._send_json({"code": 0, "data": True, "message": "success"})
+        elif path == "/v1/document/run":
+            self._send_json({"code": 0, "data": True, "message": "success"})
+        else:
+            self._send(b"not found", "text/plain", 404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def ragflow():
+    """在随机端口启动 FakeRAGFlow，返回 (app, base_url)"""
+    app = FakeRAGFlow()
+    handler = type("Handler", (_FakeHandler,), {"app": app})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield app, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,69 @@
+import pytest
+
+from RAGFlowSDK import cache
+from RAGFlowSDK.cache import ListingCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _docs(*doc_ids):
+    return [{"id": doc_id, "run": "0"} for doc_id in doc_ids]
+
+
+def test_expiry(clock):
+    listing = ListingCache(ttl=60)
+    listing.put("kb1", _docs("a", "b"))
+    clock[0] += 60
+    assert listing.get("kb1") == _docs("a", "b")
+    clock[0] += 1
+    assert listing.get("kb1") is None
+
+
+def test_writes_drop_expired_entries(clock):
+    listing = ListingCache(ttl=60)
+    listing.put("kb1", _docs("a"))
+    clock[0] += 61
+    # 只写不读时过期的列表也不能继续增长
+    for i in range(100):
+        listing.upsert("kb1", _docs(f"new-{i}"))
+    assert listing._entries == {}
+
+    listing.put("kb2", _docs("a"))
+    clock[0] += 61
+    listing.update(["a"], run="1")
+    listing.remove(["a"])
+    assert listing._entries == {}
+
+
+def test_lru_eviction(clock):
+    listing = ListingCache(ttl=60, max_entries=2)
+    listing.put("kb1", _docs("a"))
+    listing.put("kb2", _docs("b"))
+    # 访问 kb1 后 kb2 成为最久未使用的条目
+    assert listing.get("kb1") is not None
+    listing.put("kb3", _docs("c"))
+    assert listing.get("kb2") is None
+    assert listing.get("kb1") == _docs("a")
+    assert listing.get("kb3") == _docs("c")
+
+
+def test_write_through(clock):
+    listing = ListingCache(ttl=60)
+    listing.put("kb1", _docs("a", "b"))
+    listing.upsert("kb1", _docs("c"))
+    listing.upsert("kb2", _docs("x"))  # 未缓存的知识库不会被创建
+    listing.remove(["b"])
+    listing.update(["a"], run="1")
+    assert listing.get("kb1") == [{"id": "a", "run": "1"}, {"id": "c", "run": "0"}]
+    assert listing.get("kb2") is None
+
+
+def test_disabled_when_ttl_is_zero(clock):
+    listing = ListingCache(ttl=0)
+    listing.put("kb1", _docs("a"))
+    assert listing.get("kb1") is None
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from RAGFlowSDK import concurrency
+from RAGFlowSDK.concurrency import AIMDLimiter, ConcurrencyController
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的 time.monotonic"""
+    now = [1000.0]
+    monkeypatch.setattr(concurrency.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _complete(limiter, latency=0.1, error=False):
+    limiter.acquire()
+    limiter.release(latency, error)
+
+
+def test_additive_increase(clock):
+    limiter = AIMDLimiter("list", initial=2, max_limit=4)
+    # 每个成功请求增加 1/limit，约一个窗口（当前上限个请求）后上限加一
+    _complete(limiter)
+    _complete(limiter)
+    assert limiter.limit == 2
+    _complete(limiter)
+    assert limiter.limit == 3
+    for _ in range(20):
+        _complete(limiter)
+    assert limiter.limit == 4
+
+
+def test_multiplicative_decrease_with_cooldown(clock):
+    limiter = AIMDLimiter("list", initial=16, cooldown=1.0)
+    _complete(limiter, error=True)
+    assert limiter.limit == 8
+    # 冷却期内的失败不会继续削减
+    _complete(limiter, error=True)
+    assert limiter.limit == 8
+    clock[0] += 1.0
+    _complete(limiter, error=True)
+    assert limiter.limit == 4
+    assert limiter.status()["errors"] == 3
+
+
+def test_decrease_stops_at_min_limit(clock):
+    limiter = AIMDLimiter("list", initial=2, min_limit=1, cooldown=0)
+    for _ in range(5):
+        clock[0] += 1
+        _complete(limiter, error=True)
+    assert limiter.limit == 1
+
+
+def test_latency_spike(clock):
+    limiter = AIMDLimiter("list", initial=8, latency_spike=2.0)
+    _complete(limiter, latency=0.1)
+    _complete(limiter, latency=0.5)
+    assert limiter.limit == 4
+    assert limiter.status()["errors"] == 0
+
+
+def test_latency_spike_disabled_for_transfers(clock):
+    controller = ConcurrencyController(limits={"download": {"initial": 8}})
+    assert controller.limiters["upload"].latency_spike is None
+    assert controller.limiters["list"].latency_spike == 2.0
+    limiter = controller.limiters["download"]
+    _complete(limiter, latency=0.1)
+    _complete(limiter, latency=5.0)
+    assert limiter.limit == 8
+
+
+def test_slot_marks_overload_status(clock):
+    controller = ConcurrencyController(initial=4)
+    with controller.slot("rm") as outcome:
+        outcome["status_code"] = 503
+    assert controller.limiters["rm"].limit == 2
+    with controller.slot("rm") as outcome:
+        outcome["status_code"] = 200
+    assert controller.limiters["rm"].status()["in_flight"] == 0
+
+
+def test_classify():
+    classify = ConcurrencyController.classify
+    assert classify("http://host/v1/document/list?kb_id=1") == "list"
+    assert classify("http://host/v1/document/upload") == "upload"
+    assert classify("http://host/v1/document/get/abc") == "download"
+    assert classify("http://host/v1/document/rm") == "rm"
+    assert classify("http://host/v1/document/run") == "run"
+    assert classify("http://host/v1/chunk/retrieval_test") == "retrieval"
+    assert classify("http://host/v1/kb/list") == "other"
+
+
+def test_map_respects_current_limit():
+    controller = ConcurrencyController(limits={"upload": {"initial": 3, "max_limit": 3}})
+    running = [0, 0]  # 当前在途数, 最大在途数
+    lock = threading.Lock()
+
+    def work(item):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return item * 2
+
+    results = dict(controller.map("upload", work, range(20)))
+    assert results == {i: i * 2 for i in range(20)}
+    assert 1 <= running[1] <= 3
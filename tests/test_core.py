@@ -0,0 +1,188 @@
+import csv
+import json
+import sqlite3
+
+import pytest
+
+from conftest import make_pdf, pdf_hash
+
+
+@pytest.fixture
+def server(ragflow):
+    return ragflow[0]
+
+
+@pytest.fixture
+def cli(make_cli, ragflow):
+    return make_cli(ragflow[1])
+
+
+def _documents(cli, kb_id):
+    conn = sqlite3.connect(cli.db_path)
+    rows = conn.execute('SELECT doc_id, name, file_hash FROM documents WHERE kb_id = ? ORDER BY doc_id',
+                        (kb_id,)).fetchall()
+    conn.close()
+    return rows
+
+
+def test_sync_hashes_new_documents(cli, server):
+    a = server.add("kb1", "a.pdf", b"%PDF-1.4\na\n%%EOF\n")
+    b = server.add("kb1", "b.pdf", b"%PDF-1.4\nb\n%%EOF\n")
+    cli.sync("kb1")
+    assert _documents(cli, "kb1") == [(a["id"], "a.pdf", pdf_hash("a")), (b["id"], "b.pdf", pdf_hash("b"))]
+    assert cli.concurrency_status()["download"]["in_flight"] == 0
+    assert cli.concurrency_status()["download"]["successes"] == 2
+
+    # 已同步且未更新的文档不会重新下载
+    cli.sync("kb1", force_refresh=True)
+    assert server.count("GET", "/v1/document/get/") == 2
+
+
+def test_upload_directory_deduplicates(cli, server, tmp_path):
+    server.add("kb1", "existing.pdf", b"%PDF-1.4\nexisting\n%%EOF\n")
+    directory = tmp_path / "upload"
+    directory.mkdir()
+    for i in range(6):
+        make_pdf(directory, f"{i}.pdf", f"file {i}")
+    make_pdf(directory, "copy.pdf", "file 0")
+    make_pdf(directory, "old.pdf", "existing")
+    (directory / "broken.pdf").write_bytes(b"not a pdf")
+
+    result = cli.upload_directory("kb1", str(directory))
+    stats = result["stats"]
+    assert (stats["total"], stats["success"], stats["failed"]) == (9, 6, 3)
+    assert server.count("POST", "/v1/document/upload") == 6
+    assert len(_documents(cli, "kb1")) == 7
+
+
+def test_clean_duplicates(cli, server):
+    for name in ("a.pdf", "a (1).pdf", "a (2).pdf"):
+        server.add("kb1", name, b"%PDF-1.4\na\n%%EOF\n")
+    server.add("kb1", "b.pdf", b"%PDF-1.4\nb\n%%EOF\n")
+    report = cli.clean_duplicates("kb1")
+    assert "已删除文档数: 2" in report
+    assert server.count("POST", "/v1/document/rm") == 2
+    assert len(server.docs) == 2
+    assert len(_documents(cli, "kb1")) == 2
+
+
+def test_run_resets_progress_in_cache_and_database(cli, server):
+    doc = server.add("kb1", "a.pdf", b"%PDF-1.4\na\n%%EOF\n")
+    server.docs[doc["id"]][0].update(progress=1, chunk_num=12, progress_msg="done")
+    cli.sync("kb1")
+    assert cli.run([doc["id"]], 1)["success"]
+
+    cached = cli.get_all_documents("kb1")[0]
+    assert (cached["progress"], cached["chunk_num"], cached["run"]) == (0, 0, "1")
+    # 基于缓存的同步不会把旧的处理进度写回数据库
+    cli.sync("kb1")
+    conn = sqlite3.connect(cli.db_path)
+    row = conn.execute('SELECT process, process_msg, chunk_num FROM documents WHERE doc_id = ?',
+                       (doc["id"],)).fetchone()
+    conn.close()
+    assert row == ("0", "", 0)
+
+
+def test_clean_duplicates_pages_and_streams_report(cli, server, tmp_path):
+    for text in ("a", "b", "c"):
+        for i in range(3):
+            server.add("kb1", f"{text}-{i}.pdf", f"%PDF-1.4\n{text}\n%%EOF\n".encode())
+    server.add("kb1", "unique.pdf", b"%PDF-1.4\nunique\n%%EOF\n")
+    cli.sync("kb1")
+    assert [len(list(cli.iter_duplicate_groups("kb1", limit=2))),
+            len(list(cli.iter_duplicate_groups("kb1", after_hash=sorted(pdf_hash(t) for t in "abc")[0])))] == [2, 2]
+
+    report_path = tmp_path / "cleanup.txt"
+    summary = cli.clean_duplicates("kb1", report_path=str(report_path), page_size=1)
+    assert summary.splitlines()[:3] == ["重复文档清理报告", "重复文档组数: 3", "已删除文档数: 6"]
+    content = report_path.read_text(encoding="utf-8")
+    assert content.count("文件哈希值:") == 3
+    assert content.count("状态: 成功") == 6
+    assert content.rstrip().endswith("已删除文档数: 6")
+    assert len(server.docs) == 4
+    assert list(cli.iter_duplicate_groups("kb1")) == []
+
+
+def test_consecutive_operations_reuse_one_listing(cli, server):
+    for i in range(150):
+        server.add("kb1", f"{i}.pdf", f"%PDF-1.4\n{i % 100}\n%%EOF\n".encode())
+    before = server.count("GET", "/v1/document/list")
+    cli.check_duplicates("kb1")
+    # 150个文档分两页，加上确认没有更多文档的空页
+    assert server.count("GET", "/v1/document/list") - before == 3
+    report = cli.clean_duplicates("kb1")
+    assert "已删除文档数: 50" in report
+    assert server.count("GET", "/v1/document/list") - before == 3
+    # 删除已写入缓存，重新拉取的结果与缓存一致
+    assert len(cli.get_all_documents("kb1")) == len(cli.get_all_documents("kb1", force_refresh=True)) == 100
+
+
+def test_cross_kb_duplicates(cli, server):
+    server.add("kb1", "a.pdf", b"%PDF-1.4\na\n%%EOF\n")
+    server.add("kb1", "b.pdf", b"%PDF-1.4\nb\n%%EOF\n")
+    server.add("kb2", "a-copy.pdf", b"%PDF-1.4\na\n%%EOF\n")
+    cli.sync("kb1")
+    cli.sync("kb2")
+
+    assert [doc["kb_id"] for doc in cli.find_documents_by_hash(pdf_hash("a"))] == ["kb1", "kb2"]
+    assert [doc["name"] for doc in cli.find_documents_by_hash(pdf_hash("a"), exclude_kb_id="kb1")] == ["a-copy.pdf"]
+    groups = list(cli.iter_cross_kb_duplicates())
+    assert len(groups) == 1
+    assert (groups[0]["file_hash"], groups[0]["kb_count"], groups[0]["doc_count"]) == (pdf_hash("a"), 2, 2)
+
+    report = cli.check_cross_kb_duplicates().splitlines()
+    size = len(b"%PDF-1.4\na\n%%EOF\n")
+    assert report[:3] == ["跨知识库重复内容报告", "发现跨知识库重复内容组数: 1", f"重复副本总大小: {size:,} 字节"]
+    assert report.count("  - 知识库ID: kb2") == 1
+
+
+def test_upload_cross_kb_skip_and_warn(cli, server, tmp_path):
+    server.add("kb2", "a.pdf", b"%PDF-1.4\na\n%%EOF\n")
+    cli.sync("kb2")
+    path = make_pdf(tmp_path, "a.pdf", "a")
+
+    result = cli.upload_file("kb1", path, cross_kb="skip")
+    assert not result["success"] and "其他知识库中已存在相同内容" in result["message"]
+    assert server.count("POST", "/v1/document/upload") == 0
+
+    result = cli.upload_file("kb1", path, cross_kb="warn")
+    assert result["success"] and "其他知识库中已存在相同内容" in result["message"]
+    assert server.count("POST", "/v1/document/upload") == 1
+
+
+def test_unknown_cross_kb_value_is_rejected(cli, server, tmp_path):
+    path = make_pdf(tmp_path, "a.pdf", "a")
+    for call in (lambda: cli.upload_file("kb1", path, cross_kb="Skip"),
+                 lambda: cli.upload_directory("kb1", str(tmp_path), cross_kb="Skip"),
+                 lambda: cli.upload_directory_parallel("kb1", str(tmp_path), cross_kb="Skip")):
+        with pytest.raises(ValueError):
+            call()
+    assert server.count("POST", "/v1/document/upload") == 0
+
+
+def test_duplicate_report_keeps_names_with_commas(cli, server, tmp_path):
+    content = b"%PDF-1.4\na\n%%EOF\n"
+    docs = [server.add("kb1", name, content) for name in ("a, b.pdf", "c,d,e.pdf", "f.pdf")]
+    server.add("kb1", "unique, too.pdf", b"%PDF-1.4\nu\n%%EOF\n")
+    doc_ids = sorted(doc["id"] for doc in docs)
+
+    cli.sync("kb1")
+    assert [(group["hash"], sorted(group["doc_ids"])) for group in cli.get_duplicate_groups("kb1")] == [
+        (pdf_hash("a"), doc_ids)]
+
+    jsonl_path = tmp_path / "duplicates.jsonl"
+    assert cli.write_duplicate_report("kb1", str(jsonl_path)) == 1
+    records = [json.loads(line) for line in jsonl_path.read_text(encoding="utf-8").splitlines()]
+    assert len(records) == 1
+    assert (records[0]["kb_id"], records[0]["file_hash"], records[0]["count"]) == ("kb1", pdf_hash("a"), 3)
+    assert sorted(doc["name"] for doc in records[0]["docs"]) == ["a, b.pdf", "c,d,e.pdf", "f.pdf"]
+
+    csv_path = tmp_path / "duplicates.csv"
+    assert cli.write_duplicate_report("kb1", str(csv_path)) == 1
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert sorted((row["doc_id"], row["name"]) for row in rows) == sorted((doc["id"], doc["name"]) for doc in docs)
+    assert sorted(row["rank"] for row in rows) == ["0", "1", "2"]
+
+    text = "\n".join(cli.iter_duplicate_report_lines("kb1"))
+    assert "    文件名: a, b.pdf" in text and "    文件名: c,d,e.pdf" in text
@@ -0,0 +1,91 @@
+import importlib.util
+import os
+import sqlite3
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from RAGFlowSDK.concurrency import ConcurrencyController
+from RAGFlowSDK.loadtest import RetrievalLoadRunner, load_queries, percentile
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+
+
+class SleepingClient:
+    """固定延迟的检索客户端"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.concurrency = ConcurrencyController()
+
+    def retrieval_test(self, kb_id, question, **kwargs):
+        time.sleep(self.latency)
+        return {"success": True, "message": "检索成功", "chunks": [{"content": question}], "total": 1}
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_load_queries(tmp_path):
+    text = tmp_path / "queries.txt"
+    text.write_text("a\n\nb\n", encoding="utf-8")
+    jsonl = tmp_path / "queries.jsonl"
+    jsonl.write_text('{"question": "c"}\n{"question": "d", "id": 1}\n', encoding="utf-8")
+    assert load_queries(str(text)) == ["a", "b"]
+    assert load_queries(str(jsonl)) == ["c", "d"]
+
+
+def test_closed_loop_excludes_queueing():
+    client = SleepingClient(0.05)
+    result = RetrievalLoadRunner(client, "kb1", concurrency=1).run(["q"] * 5)
+    assert result["total"] == 5 and result["errors"] == 0
+    # 所有查询一次性提交到单线程的线程池，排队时间不能计入延迟
+    assert result["latency_p99"] < 0.09
+    # 压测结束后恢复检索接口的并发上限范围
+    limiter = client.concurrency.limiters["retrieval"]
+    assert (limiter.min_limit, limiter.max_limit) == (1, 32)
+
+
+def test_open_loop_includes_queueing():
+    client = SleepingClient(0.05)
+    # 目标QPS超过单并发的处理能力，后面的查询要等待，等待时间计入延迟
+    result = RetrievalLoadRunner(client, "kb1", concurrency=1, qps=100).run(["q"] * 5)
+    assert result["latency_p99"] > 0.15
+
+
+@pytest.fixture
+def standin_server():
+    spec = importlib.util.spec_from_file_location("retrieval_standin_server",
+                                                  os.path.join(EXAMPLES_DIR, "retrieval_standin_server.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    handler = type("Handler", (module.StandInHandler,), {"latency": 0.01, "chunks": 3})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_load_test_against_standin_server(make_cli, standin_server, tmp_path):
+    cli = make_cli(standin_server)
+    queries = tmp_path / "queries.txt"
+    queries.write_text("什么是RAG\n如何上传文档\n", encoding="utf-8")
+    result = cli.load_test_retrieval("kb1", str(queries), concurrency=2, rounds=3)
+    assert (result["total"], result["errors"], result["results_mean"]) == (6, 0, 3)
+    assert 0 < result["latency_p50"] <= result["latency_p95"] <= result["latency_p99"]
+
+    conn = sqlite3.connect(cli.db_path)
+    row = conn.execute('SELECT kb_id, total, doc_count, concurrency FROM retrieval_runs WHERE run_id = ?',
+                       (result["run_id"],)).fetchone()
+    conn.close()
+    assert row == ("kb1", 6, 0, 2)
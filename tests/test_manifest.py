@@ -0,0 +1,69 @@
+import hashlib
+
+import pytest
+
+from RAGFlowSDK.manifest import ManifestReader, write_manifest
+
+from conftest import insert_documents
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@pytest.fixture
+def cli(make_cli):
+    cli = make_cli()
+    insert_documents(cli.db_path, [
+        ("doc-a", "kb1", "a.pdf", _hash("a"), "1", "1.0"),
+        ("doc-b", "kb1", "b.pdf", _hash("b"), "0", "0"),
+        ("doc-c", "kb2", "c.pdf", _hash("c"), "1", "1.0"),
+    ])
+    return cli
+
+
+def test_lookup(cli, tmp_path):
+    path = str(tmp_path / "kb1.manifest")
+    result = write_manifest(cli.db_path, "kb1", path)
+    assert result == {"updated": True, "count": 2, "path": path}
+    with ManifestReader(path, kb_id="kb1") as manifest:
+        assert manifest.kb_id == "kb1"
+        assert len(manifest) == 2
+        assert manifest.lookup(_hash("a")) == ("doc-a", 1)
+        assert manifest.lookup(_hash("b")) == ("doc-b", 0)
+        assert _hash("c") not in manifest
+
+
+def test_unchanged_manifest_is_not_rewritten(cli, tmp_path):
+    path = str(tmp_path / "kb1.manifest")
+    write_manifest(cli.db_path, "kb1", path)
+    assert write_manifest(cli.db_path, "kb1", path)["updated"] is False
+    insert_documents(cli.db_path, [("doc-d", "kb1", "d.pdf", _hash("d"), "0", "0")])
+    assert write_manifest(cli.db_path, "kb1", path) == {"updated": True, "count": 3, "path": path}
+
+
+def test_other_kb_manifest_is_rejected(cli, tmp_path):
+    path = str(tmp_path / "kb1.manifest")
+    write_manifest(cli.db_path, "kb1", path)
+    with pytest.raises(ValueError):
+        ManifestReader(path, kb_id="kb2")
+    # 写入同一路径时按知识库重建
+    assert write_manifest(cli.db_path, "kb2", path)["updated"] is True
+
+    file_path = tmp_path / "c.pdf"
+    file_path.write_bytes(b"c")
+    with ManifestReader(path) as manifest:
+        assert cli.check_file_exists("kb2", str(file_path), manifest=manifest)
+        with pytest.raises(ValueError):
+            cli.check_file_exists("kb1", str(file_path), manifest=manifest)
+
+
+def test_sync_refresh_manifest_only_when_requested(cli, monkeypatch):
+    cli.export_manifest("kb1")
+    monkeypatch.setattr(cli, "get_all_documents", lambda kb_id, force_refresh=False: [])
+    calls = []
+    monkeypatch.setattr(cli, "export_manifest", lambda kb_id: calls.append(kb_id))
+    cli.sync("kb1", refresh_manifest=False)
+    assert calls == []
+    cli.sync("kb1")
+    assert calls == ["kb1"]
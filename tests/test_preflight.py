@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from RAGFlowSDK.preflight import check_file, preflight, schedule_by_size
+
+
+def _write(directory, name: str, content: bytes) -> str:
+    path = directory / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_check_file(tmp_path):
+    valid = _write(tmp_path, "ok.pdf", b"%PDF-1.4\nbody\n%%EOF\n")
+    assert check_file(valid) == (None, os.path.getsize(valid))
+    assert check_file(_write(tmp_path, "empty.pdf", b"")) == ("文件为空（0字节）", 0)
+    assert check_file(valid, max_size=4)[0].startswith("文件大小")
+    assert check_file(_write(tmp_path, "fake.pdf", b"<html>%%EOF"))[0].startswith("文件头")
+    assert check_file(_write(tmp_path, "cut.pdf", b"%PDF-1.4\nbody"))[0].startswith("PDF文件缺少")
+    assert check_file(_write(tmp_path, "a.exe", b"MZ"))[0].startswith("不支持的文件类型")
+    reason, size = check_file(str(tmp_path / "missing.pdf"))
+    assert reason.startswith("无法读取文件") and size is None
+
+
+@pytest.mark.skipif(os.name != "posix" or os.geteuid() == 0, reason="需要以非root用户运行才能测试无读权限")
+def test_unreadable_file_is_rejected(tmp_path):
+    path = _write(tmp_path, "locked.pdf", b"%PDF-1.4\nbody\n%%EOF\n")
+    os.chmod(path, 0)
+    reason, size = check_file(path)
+    assert reason.startswith("无法读取文件")
+    assert size > 0
+
+
+def test_unreadable_directory_entry_is_rejected(tmp_path):
+    # 目录可以stat但不能按文件打开
+    path = tmp_path / "folder.pdf"
+    path.mkdir()
+    reason, _ = check_file(str(path))
+    assert reason.startswith("无法读取文件")
+
+
+def test_preflight_and_schedule(tmp_path):
+    files = [_write(tmp_path, f"{size}.pdf", b"%PDF-" + b"x" * size + b"%%EOF") for size in (30, 10, 40, 20)]
+    files.append(_write(tmp_path, "bad.pdf", b"nope"))
+    accepted, rejected = preflight(files)
+    assert [size for _, size in accepted] == [40, 20, 50, 30]
+    assert rejected == [{"file": files[-1], "error": "预检未通过: 文件头与扩展名 .pdf 不匹配，文件可能已损坏"}]
+    assert [os.path.basename(path) for path in schedule_by_size(accepted)] == ["10.pdf", "40.pdf", "20.pdf", "30.pdf"]
@@ -0,0 +1,116 @@
+import sqlite3
+
+import pytest
+
+from RAGFlowSDK.watcher import WatchFolderDaemon
+
+from conftest import make_pdf
+
+
+@pytest.fixture
+def server(ragflow):
+    return ragflow[0]
+
+
+@pytest.fixture
+def cli(make_cli, ragflow):
+    return make_cli(ragflow[1])
+
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / "watch"
+    path.mkdir()
+    return path
+
+
+def _daemon(cli, folder, **kwargs):
+    options = dict(settle_seconds=0, full_scan_interval=0, retry_backoff=0)
+    options.update(kwargs)
+    return WatchFolderDaemon(cli, "kb1", str(folder), **options)
+
+
+def _state(cli, path):
+    conn = sqlite3.connect(cli.db_path)
+    row = conn.execute('SELECT state, attempts FROM watch_files WHERE path = ?', (str(path),)).fetchone()
+    conn.close()
+    return row
+
+
+def test_uploads_new_files_once(cli, server, folder):
+    make_pdf(folder, "a.pdf", "a")
+    (folder / "sub").mkdir()
+    make_pdf(folder / "sub", "b.pdf", "b")
+    make_pdf(folder, "copy.pdf", "a")
+    daemon = _daemon(cli, folder, auto_parse=True)
+    stats = daemon.run_once()
+    assert stats == {"success": 2, "failed": 1, "retrying": 0, "parsed": 2}
+    assert daemon.run_once() == {"success": 0, "failed": 0, "retrying": 0, "parsed": 0}
+    assert server.count("POST", "/v1/document/upload") == 2
+
+
+def test_batch_sync_only_reads_recent_pages(cli, server, folder):
+    for i in range(150):
+        server.add("kb1", f"{i}.pdf", f"%PDF-1.4\n{i}\n%%EOF\n".encode())
+    cli.sync("kb1")
+    lists = server.count("GET", "/v1/document/list")
+    downloads = server.count("GET", "/v1/document/get/")
+
+    make_pdf(folder, "new.pdf", "new")
+    assert _daemon(cli, folder).run_once()["success"] == 1
+    # 第一页包含新文档，第二页全部已知即停止；只下载新文档
+    assert server.count("GET", "/v1/document/list") - lists == 2
+    assert server.count("GET", "/v1/document/get/") - downloads == 1
+
+
+def test_transient_failure_is_retried_with_backoff(cli, server, folder):
+    path = make_pdf(folder, "a.pdf", "a")
+    server.upload_failures = 1
+    daemon = _daemon(cli, folder, retry_backoff=3600)
+    assert daemon.run_once() == {"success": 0, "failed": 0, "retrying": 1, "parsed": 0}
+    assert _state(cli, path) == ("pending", 1)
+    # 退避期内不会重试
+    assert daemon.run_once()["retrying"] == 0
+    assert server.count("POST", "/v1/document/upload") == 1
+
+    daemon.retry_backoff = 0
+    conn = sqlite3.connect(cli.db_path)
+    conn.execute('UPDATE watch_files SET changed_at = 0')
+    conn.commit()
+    conn.close()
+    assert daemon.run_once()["success"] == 1
+    assert _state(cli, path) == ("done", 1)
+
+
+def test_transient_failure_gives_up_after_max_attempts(cli, server, folder):
+    path = make_pdf(folder, "a.pdf", "a")
+    server.upload_failures = 10
+    stats = _daemon(cli, folder, max_attempts=3).run_once()
+    assert stats == {"success": 0, "failed": 1, "retrying": 2, "parsed": 0}
+    assert _state(cli, path) == ("failed", 3)
+
+
+def test_permanent_failure_is_not_retried(cli, server, folder):
+    path = folder / "broken.pdf"
+    path.write_bytes(b"not a pdf")
+    assert _daemon(cli, folder).run_once()["failed"] == 1
+    assert _state(cli, path) == ("failed", 0)
+    assert server.count("POST", "/v1/document/upload") == 0
+
+
+def test_manifest_refreshed_on_interval_not_per_batch(cli, server, folder, monkeypatch):
+    cli.export_manifest("kb1")
+    refreshed = []
+    monkeypatch.setattr(cli, "export_manifest", lambda kb_id: refreshed.append(kb_id))
+    make_pdf(folder, "a.pdf", "a")
+    make_pdf(folder, "b.pdf", "b")
+    daemon = _daemon(cli, folder, batch_size=1, manifest_interval=3600)
+    assert daemon.run_once()["success"] == 2
+    assert refreshed == []
+
+    daemon.manifest_interval = 0
+    daemon.run_once()
+    assert refreshed == ["kb1"]
+    # 没有新上传时不刷新
+    daemon.run_once()
+    assert refreshed == ["kb1"]
@@ -0,0 +1,144 @@
+import time
+
+import pytest
+
+from RAGFlowSDK import workqueue
+from RAGFlowSDK.workqueue import UploadQueue
+
+from conftest import make_pdf
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(workqueue.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def files(tmp_path):
+    return [make_pdf(tmp_path, f"{i}.pdf", f"file {i}") for i in range(3)]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return UploadQueue(str(tmp_path / "queue.db"), lease_seconds=10, max_attempts=2)
+
+
+def test_claim_in_order_and_complete(queue, files, clock):
+    assert queue.enqueue("job", "kb1", files) == 3
+    # 重复登记不会产生重复任务
+    assert queue.enqueue("job", "kb1", files) == 0
+    assert queue.claim("job", "a") == files[0]
+    assert queue.claim("job", "b") == files[1]
+    assert queue.complete("job", files[0], "a", True, "ok")
+    assert queue.complete("job", files[1], "b", False, "bad")
+    assert queue.remaining("job") == 1
+    stats = queue.stats("job")
+    assert (stats["total"], stats["success"], stats["failed"]) == (3, 1, 1)
+    assert stats["failed_files"] == [{"file": files[1], "error": "bad"}]
+
+
+def test_expired_lease_is_reclaimed(queue, files, clock):
+    queue.enqueue("job", "kb1", files[:1])
+    assert queue.claim("job", "a") == files[0]
+    assert queue.claim("job", "b") is None
+    # 心跳续约后不会被其他进程领取
+    clock[0] += 8
+    assert queue.heartbeat("job", "a") == 1
+    clock[0] += 8
+    assert queue.claim("job", "b") is None
+    clock[0] += 3
+    assert queue.claim("job", "b") == files[0]
+    # 租约已被接管，原持有者的结果不会覆盖
+    assert not queue.complete("job", files[0], "a", True, "ok")
+    assert queue.complete("job", files[0], "b", True, "ok")
+
+
+def test_repeated_expiry_marks_failed(queue, files, clock):
+    queue.enqueue("job", "kb1", files[:1])
+    for owner in ("a", "b"):
+        assert queue.claim("job", owner) == files[0]
+        clock[0] += 11
+    assert queue.claim("job", "c") is None
+    stats = queue.stats("job")
+    assert stats["failed"] == 1 and queue.remaining("job") == 0
+
+
+def test_defer_does_not_count_attempt(queue, files, clock):
+    queue.enqueue("job", "kb1", files[:1])
+    for owner in ("a", "b", "c"):
+        assert queue.claim("job", owner) == files[0]
+        queue.defer("job", files[0], owner, 5)
+        assert queue.claim("job", "x") is None
+        clock[0] += 6
+    assert queue.claim("job", "d") == files[0]
+
+
+def test_claim_hash(queue, files, clock):
+    queue.enqueue("job", "kb1", files)
+    assert queue.claim_hash("job", "h1", files[0]) == "owned"
+    assert queue.claim_hash("job", "h1", files[1]) == "busy"
+    # 重新领取自己登记过的上传权
+    assert queue.claim_hash("job", "h1", files[0]) == "owned"
+    queue.mark_uploading("job", "h1")
+    assert queue.claim_hash("job", "h1", files[0]) == "verify"
+    queue.release_hash("job", "h1", done=True)
+    assert queue.claim_hash("job", "h1", files[0]) == "uploaded"
+    assert queue.claim_hash("job", "h1", files[1]) == "done"
+
+    # 上传失败后释放上传权，相同内容的其他文件可以重试
+    assert queue.claim_hash("job", "h2", files[1]) == "owned"
+    queue.release_hash("job", "h2", done=False)
+    assert queue.claim_hash("job", "h2", files[2]) == "owned"
+
+
+def test_claim_hash_takeover_from_failed_holder(queue, files, clock):
+    queue.enqueue("job", "kb1", files[:2])
+    assert queue.claim("job", "a") == files[0]
+    assert queue.claim_hash("job", "h", files[0]) == "owned"
+    queue.mark_uploading("job", "h")
+    queue.complete("job", files[0], "a", False, "崩溃")
+    # 持有者已经失败但可能发出过上传请求，接管者需要先核对
+    assert queue.claim_hash("job", "h", files[1]) == "verify"
+
+
+def test_worker_does_not_reupload_after_crash(make_cli, ragflow, tmp_path):
+    server, base_url = ragflow
+    cli = make_cli(base_url)
+    file_path = make_pdf(tmp_path, "a.pdf", "a")
+    queue = UploadQueue(cli.db_path, lease_seconds=0.2)
+    queue.enqueue("job", "kb1", [file_path])
+    # 模拟：领取并上传成功后、记录结果前进程崩溃
+    assert queue.claim("job", "crashed") == file_path
+    file_hash = cli._calculate_file_hash(file_path)
+    assert queue.claim_hash("job", file_hash, file_path) == "owned"
+    queue.mark_uploading("job", file_hash)
+    assert cli.upload_file("kb1", file_path, file_hash=file_hash, sync_after=False)["success"]
+    time.sleep(0.3)
+
+    stats = cli.work_upload_queue("kb1", "job", lease_seconds=0.2, poll_interval=0.05)
+    assert stats == {"success": 1, "failed": 0, "deferred": 0}
+    assert server.count("POST", "/v1/document/upload") == 1
+    assert queue.stats("job")["success"] == 1
+
+
+def test_worker_uploads_queue(make_cli, ragflow, tmp_path):
+    server, base_url = ragflow
+    cli = make_cli(base_url)
+    paths = [make_pdf(tmp_path, f"{i}.pdf", f"file {i}") for i in range(3)]
+    paths.append(make_pdf(tmp_path, "copy.pdf", "file 0"))
+    UploadQueue(cli.db_path).enqueue("job", "kb1", paths)
+    stats = cli.work_upload_queue("kb1", "job", poll_interval=0.05)
+    assert stats == {"success": 3, "failed": 1, "deferred": 0}
+    assert server.count("POST", "/v1/document/upload") == 3
+
+
+def test_enqueue_records_missing_file_as_failed(queue, files, tmp_path):
+    missing = str(tmp_path / "gone.pdf")
+    assert queue.enqueue("job", "kb1", [files[0], missing, files[1]]) == 3
+    assert queue.remaining("job") == 2
+    stats = queue.stats("job")
+    assert stats["failed"] == 1
+    assert stats["failed_files"][0]["file"] == missing
+    assert stats["failed_files"][0]["error"].startswith("读取文件失败")